@@ -0,0 +1,163 @@
+"""
+Local stand-in for the OpenAI endpoints Potemkin calls, for offline
+benchmarking: POST /v1/chat/completions (plain and streamed) and
+POST /v1/realtime/sessions.
+
+    python bench/mock_openai.py --port 8900 --latency 0.8 --error-rate 0.05
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8900/v1 and
+OPENAI_REALTIME_SESSIONS_URL=http://127.0.0.1:8900/v1/realtime/sessions.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CARDS = [
+    {"title": "Progress", "description": "Concrete pour on level 4 appears complete; formwork is being moved to level 5."},
+    {"title": "Safety detection (PPE compliance)", "description": "Three workers visible; all wear helmets and high-visibility vests."},
+    {"title": "Budgetary risk & outlier detection", "description": "Rebar stock near the crane looks lower than planned for this week."},
+]
+
+
+def render_content(shape):
+    """
+    Model output in one of the shapes seen in production.
+    """
+    if shape == 'mixed':
+        shape = random.choice(['json', 'fenced', 'prose'])
+    if shape == 'fenced':
+        return "```json\n" + json.dumps(CARDS, indent=2) + "\n```"
+    if shape == 'prose':
+        return "The image shows a construction site. " + " ".join(c["description"] for c in CARDS)
+    return json.dumps(CARDS)
+
+
+class MockConfig:
+    def __init__(self, latency=0.5, jitter=0.1, token_delay=0.01, error_rate=0.0, shape='json', chunk_size=16):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.shape = shape
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def delay(self):
+        return max(0.0, random.gauss(self.latency, self.jitter))
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _json(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                body = {}
+            with config.lock:
+                config.calls += 1
+            time.sleep(config.delay())
+            if random.random() < config.error_rate:
+                return self._json(500, {"error": {"message": "mock upstream error", "type": "server_error"}})
+            path = self.path.split('?', 1)[0]
+            if path.endswith('/chat/completions'):
+                return self._chat(body)
+            if path.endswith('/realtime/sessions'):
+                return self._json(200, {
+                    "id": "sess_mock",
+                    "object": "realtime.session",
+                    "model": body.get("model"),
+                    "voice": body.get("voice"),
+                    "client_secret": {"value": "ek_mock", "expires_at": int(time.time()) + 60},
+                })
+            return self._json(404, {"error": {"message": f"no mock for {path}"}})
+
+        def _chat(self, body):
+            model = body.get('model', 'mock')
+            created = int(time.time())
+            if body.get('messages') and body['messages'][-1].get('role') == 'user' \
+                    and isinstance(body['messages'][-1].get('content'), str):
+                # Text-only (voice) prompt
+                content = "Based on the latest analysis, all visible workers are wearing PPE."
+            else:
+                content = render_content(config.shape)
+            if not body.get('stream'):
+                return self._json(200, {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 900, "completion_tokens": len(content) // 4,
+                              "total_tokens": 900 + len(content) // 4},
+                })
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for i in range(0, len(content), config.chunk_size):
+                chunk = {
+                    "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + config.chunk_size]},
+                                 "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(config.token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return Handler
+
+
+def start(port=0, **options):
+    """
+    Start the mock in a background thread; returns (server, config).
+    """
+    config = MockConfig(**options)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.5, help='mean response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.1, help='stddev of the response delay')
+    parser.add_argument('--token-delay', type=float, default=0.01, help='delay between streamed chunks')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with HTTP 500')
+    parser.add_argument('--shape', choices=['json', 'fenced', 'prose', 'mixed'], default='json')
+    args = parser.parse_args()
+    server, _ = start(args.port, latency=args.latency, jitter=args.jitter, token_delay=args.token_delay,
+                      error_rate=args.error_rate, shape=args.shape)
+    print(f"Mock OpenAI listening on http://127.0.0.1:{server.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""
+Offline benchmark for Potemkin. Starts a local OpenAI stand-in
+(bench/mock_openai.py), seeds a run history of each requested size, serves
+the app, and drives its endpoints at a fixed concurrency. Reports
+p50/p95/p99 latency and requests/sec per endpoint and history size.
+
+    python bench/run_bench.py --history 10,1000,100000 --concurrency 8 --requests 200
+    python bench/run_bench.py --endpoints voice,export --latency 0.2 --error-rate 0.1 --json bench.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+import mock_openai  # noqa: E402
+from run_store import RunStore  # noqa: E402
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+
+ENDPOINTS = ('analysis', 'analysis_stream', 'voice', 'session', 'export')
+
+VOICE_PROMPTS = [
+    "Is everyone wearing PPE?",
+    "How far along is the fourth floor?",
+    "Are there any budget risks today?",
+    "What changed since the last flight?",
+    "Summarize the site status in one sentence.",
+]
+
+
+def synthetic_frames(count, size=(512, 384), seed=1):
+    """
+    JPEG snapshots that look roughly like a site from above: a gradient
+    ground plane with random blocks. Each frame differs so the frame cache
+    does not hide model latency (use --repeat-frames to exercise it).
+    """
+    if Image is None:
+        # Without Pillow, send opaque bytes; the app still forwards them
+        rng = random.Random(seed)
+        return [bytes(rng.getrandbits(8) for _ in range(20000)) for _ in range(count)]
+    rng = random.Random(seed)
+    frames = []
+    for _ in range(count):
+        img = Image.new('RGB', size)
+        draw = ImageDraw.Draw(img)
+        for y in range(0, size[1], 8):
+            shade = 90 + y * 80 // size[1]
+            draw.rectangle((0, y, size[0], y + 8), fill=(shade, shade - 10, shade - 30))
+        for _ in range(rng.randint(8, 20)):
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            w, h = rng.randint(10, 120), rng.randint(10, 120)
+            draw.rectangle((x, y, x + w, y + h), fill=tuple(rng.randrange(256) for _ in range(3)))
+        buf = io.BytesIO()
+        img.save(buf, 'JPEG', quality=80)
+        frames.append(buf.getvalue())
+    return frames
+
+
+def seed_history(data_dir, count, batch=5000):
+    """
+    Write ``count`` runs one minute apart, the newest a minute before now.
+    Returns the timestamp of the oldest run.
+    """
+    store = RunStore(data_dir, legacy_file=None)
+    now = time.time()
+    rng = random.Random(count)
+    written = 0
+    while written < count:
+        n = min(batch, count - written)
+        store.append_many([
+            {'cards': [dict(c, description=c['description'] + f" (run {written + i})") for c in mock_openai.CARDS],
+             'site': rng.choice(['site-a', 'site-b']),
+             'ts': now - (count - written - i) * 60}
+            for i in range(n)
+        ])
+        written += n
+    return now - count * 60
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, proc, timeout=120):
+    end = time.time() + timeout
+    while time.time() < end:
+        if proc.poll() is not None:
+            raise RuntimeError("app exited during startup")
+        try:
+            if requests.get(url, timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"app not ready after {timeout}s")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return float('nan')
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class Driver:
+    def __init__(self, base_url, frames, bypass_cache, history=0, first_ts=None, export_runs=50,
+                 repeat_prompts=False):
+        self.base_url = base_url
+        self.frames = frames
+        self.bypass_cache = bypass_cache
+        self.repeat_prompts = repeat_prompts
+        self.history = history
+        self.first_ts = first_ts
+        self.export_runs = export_runs
+        self._local = threading.local()
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _session(self):
+        s = getattr(self._local, 'session', None)
+        if s is None:
+            s = self._local.session = requests.Session()
+        return s
+
+    def _next(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def call(self, endpoint):
+        i = self._next()
+        s = self._session()
+        url = self.base_url
+        if endpoint in ('analysis', 'analysis_stream'):
+            frame = self.frames[i % len(self.frames)]
+            data = {'bypass_cache': '1'} if self.bypass_cache else {}
+            path = '/api/analysis' if endpoint == 'analysis' else '/api/analysis/stream'
+            resp = s.post(url + path, files={'snapshot': ('snapshot.jpg', frame, 'image/jpeg')}, data=data,
+                          timeout=300, stream=endpoint == 'analysis_stream')
+            ok = resp.ok and (endpoint == 'analysis' or 'event: done' in resp.text)
+        elif endpoint == 'voice':
+            prompt = VOICE_PROMPTS[i % len(VOICE_PROMPTS)]
+            if not self.repeat_prompts:
+                # Unique wording per request so the voice reply cache can't answer it
+                prompt = f"{prompt} (request {i})"
+            resp = s.post(url + '/api/voice', json={'input': prompt}, timeout=300)
+            ok = resp.ok
+        elif endpoint == 'session':
+            resp = s.get(url + '/session', timeout=300)
+            ok = resp.ok
+        else:
+            resp = s.get(url + '/api/export-pdf', params=self._export_window(i), timeout=300)
+            ok = resp.ok and resp.content[:4] == b'%PDF'
+        return ok, resp.status_code
+
+    def _export_window(self, i):
+        """
+        ``export_runs`` runs ending at a different seeded run per request, so
+        each export selects from the full history and renders a new run set.
+        """
+        if not self.history or self.first_ts is None:
+            return {'last': self.export_runs}
+        end = self.history - 1 - (i * 7919) % self.history
+        return {'last': self.export_runs, 'until': self.first_ts + end * 60 + 1}
+
+    def run(self, endpoint, total, concurrency):
+        latencies, errors, statuses = [], 0, {}
+
+        def one(_):
+            start = time.perf_counter()
+            try:
+                ok, status = self.call(endpoint)
+            except requests.RequestException:
+                ok, status = False, 'exc'
+            return ok, status, time.perf_counter() - start
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for ok, status, elapsed in pool.map(one, range(total)):
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if not ok:
+                    errors += 1
+        wall = time.perf_counter() - began
+        latencies.sort()
+        return {
+            'requests': total,
+            'errors': errors,
+            'statuses': statuses,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'rps': total / wall if wall else float('nan'),
+        }
+
+
+def bench_history(size, args, mock_url, frames):
+    data_dir = tempfile.mkdtemp(prefix=f'potemkin-bench-{size}-')
+    proc = None
+    try:
+        t = time.perf_counter()
+        first_ts = seed_history(data_dir, size)
+        seeded = time.perf_counter() - t
+        port = free_port()
+        env = dict(os.environ)
+        env.update({
+            'DATA_DIR': data_dir,
+            'OPENAI_API_KEY': 'sk-bench',
+            'OPENAI_BASE_URL': mock_url,
+            'OPENAI_REALTIME_SESSIONS_URL': mock_url + '/realtime/sessions',
+            'OUTBOUND_RETRIES': str(args.max_retries),
+            'MODEL': 'gpt-4o-realtime-preview',
+            'VOICE': 'alloy',
+            'LOG_LEVEL': 'WARNING',
+            'INGEST_SOURCE': '',
+        })
+        if not args.frame_cache:
+            env['FRAME_CACHE_ENABLED'] = '0'
+        if not args.export_cache:
+            env['REPORT_CACHE_SIZE'] = '0'
+        t = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(HERE, 'serve_app.py'), '--port', str(port)],
+                                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL if not args.verbose else None)
+        base_url = f'http://127.0.0.1:{port}'
+        wait_ready(base_url + '/metrics', proc)
+        startup = time.perf_counter() - t
+        driver = Driver(base_url, frames, bypass_cache=not args.frame_cache, history=size, first_ts=first_ts,
+                        export_runs=args.export_runs, repeat_prompts=args.voice_cache)
+        results = {'history': size, 'seed_s': seeded, 'startup_s': startup, 'endpoints': {}}
+        for endpoint in args.endpoints:
+            for _ in range(args.warmup):
+                driver.call(endpoint)
+            results['endpoints'][endpoint] = driver.run(endpoint, args.requests, args.concurrency)
+        return results
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def print_report(all_results):
+    header = f"{'history':>8} {'endpoint':<16} {'n':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}"
+    print(header)
+    print('-' * len(header))
+    for res in all_results:
+        for endpoint, r in res['endpoints'].items():
+            print(f"{res['history']:>8} {endpoint:<16} {r['requests']:>6} {r['errors']:>5} "
+                  f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['rps']:>8.1f}")
+        print(f"{'':>8} (seed {res['seed_s']:.1f}s, startup {res['startup_s']:.1f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', default='10,1000,100000', help='comma-separated run history sizes')
+    parser.add_argument('--endpoints', default='analysis,voice,session,export',
+                        help='comma-separated subset of: ' + ','.join(ENDPOINTS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=100, help='requests per endpoint and history size')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--frames', type=int, default=32, help='distinct synthetic snapshots to cycle through')
+    parser.add_argument('--frame-cache', action='store_true', help='leave the frame cache on (frames repeat)')
+    parser.add_argument('--export-runs', type=int, default=50, help='runs per exported report')
+    parser.add_argument('--export-cache', action='store_true', help='leave the report cache on')
+    parser.add_argument('--voice-cache', action='store_true',
+                        help='cycle a few fixed voice prompts so repeats hit the voice reply cache')
+    parser.add_argument('--latency', type=float, default=0.5, help='mock model latency (s)')
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--token-delay', type=float, default=0.005)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--shape', choices=['json', 'fenced', 'prose', 'mixed'], default='json')
+    parser.add_argument('--max-retries', type=int, default=0, help='OUTBOUND_RETRIES for the app')
+    parser.add_argument('--json', help='also write results to this file')
+    parser.add_argument('--verbose', action='store_true', help='show app stderr')
+    args = parser.parse_args()
+    args.endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    sizes = [int(x) for x in args.history.split(',') if x.strip()]
+
+    server, _ = mock_openai.start(0, latency=args.latency, jitter=args.jitter, token_delay=args.token_delay,
+                                  error_rate=args.error_rate, shape=args.shape)
+    mock_url = f'http://127.0.0.1:{server.server_address[1]}/v1'
+    frames = synthetic_frames(args.frames)
+    all_results = []
+    try:
+        for size in sizes:
+            print(f"== history {size} ==", flush=True)
+            all_results.append(bench_history(size, args, mock_url, frames))
+    finally:
+        server.shutdown()
+    print_report(all_results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': all_results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
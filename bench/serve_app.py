@@ -0,0 +1,31 @@
+"""
+Serve main.app with a threaded WSGI server and no debug reloader, for
+benchmarking. Configuration comes from the environment (DATA_DIR,
+OPENAI_BASE_URL, ...).
+
+    python bench/serve_app.py --port 5055
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import make_server  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+    # main.py resolves instruction.md and the skeleton PDF relative to the CWD
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import main as potemkin
+    server = make_server(args.host, args.port, potemkin.app, threaded=True)
+    print(f"Potemkin serving on http://{args.host}:{args.port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import re
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+_FENCE_RE = re.compile(r"```(?:json)?")
+
+
+def strip_code_fences(text):
+    """
+    Model reply text without markdown code fences around the JSON.
+    """
+    return _FENCE_RE.sub('', text).strip()
+
+
+def parse_batch_cards(text, count):
+    """
+    Map a batched completion back to its frames; returns a list with one
+    card list (or None when the frame is missing) per frame. Items are
+    placed by their 1-based ``frame`` number, else by position.
+    """
+    results = [None] * count
+    try:
+        data = json.loads(strip_code_fences(text))
+    except ValueError:
+        return results
+    if isinstance(data, dict):
+        data = data.get('frames') or data.get('results') or []
+    if not isinstance(data, list):
+        return results
+    for position, item in enumerate(data):
+        index, cards = position, None
+        if isinstance(item, dict) and isinstance(item.get('cards'), list):
+            cards = item['cards']
+            try:
+                index = int(item.get('frame', position + 1)) - 1
+            except (TypeError, ValueError):
+                pass
+        elif isinstance(item, list):
+            cards = item
+        if cards is not None and 0 <= index < count and results[index] is None:
+            results[index] = cards
+    return results
+
+
+class CardStreamParser:
+    """
+    Incremental parser for a streamed JSON array of card objects.
+
+    Feed raw model text as it arrives; ``feed`` returns every top-level
+    object in the array that closed within that chunk. Anything before the
+    opening ``[`` (markdown fences, preamble) is ignored, and string
+    contents are tracked so braces inside descriptions don't confuse it.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.cards = []
+        self._pos = 0
+        self._started = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._obj_start = None
+
+    @property
+    def started(self):
+        return self._started
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def feed(self, chunk):
+        if not chunk:
+            return []
+        self.text += chunk
+        found = []
+        text = self.text
+        i = self._pos
+        n = len(text)
+        while i < n and not self._finished:
+            ch = text[i]
+            if not self._started:
+                if ch == '[':
+                    self._started = True
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+                if ch == '{' and self._depth == 2:
+                    self._obj_start = i
+            elif ch in '}]':
+                if ch == '}' and self._depth == 2 and self._obj_start is not None:
+                    card = self._decode(text[self._obj_start:i + 1])
+                    if card is not None:
+                        self.cards.append(card)
+                        found.append(card)
+                    self._obj_start = None
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finished = True
+            i += 1
+        self._pos = i
+        return found
+
+    def _decode(self, fragment):
+        try:
+            card = json.loads(fragment)
+        except ValueError as e:
+            logger.warning("CardStreamParser: skipping malformed card: %s", e)
+            return None
+        return card if isinstance(card, dict) else None
@@ -0,0 +1,136 @@
+import io
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+    logger.warning("Pillow not installed; perceptual frame cache disabled")
+
+
+def dhash(image_bytes, hash_size=8):
+    """
+    Difference hash of an encoded image: grayscale, shrink to
+    (hash_size+1) x hash_size and compare horizontally adjacent pixels.
+    Returns an int of hash_size*hash_size bits, or None if decoding fails.
+    """
+    if Image is None:
+        return None
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        img.draft('L', (hash_size * 8, hash_size * 8))
+        img = img.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    except Exception as e:
+        logger.debug("dhash: could not decode image: %s", e)
+        return None
+    px = list(img.getdata())
+    value = 0
+    for row in range(hash_size):
+        base = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (1 if px[base + col] > px[base + col + 1] else 0)
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class FrameCache:
+    """
+    Similarity cache mapping perceptual hashes of frames to analysis cards.
+
+    A lookup hits when a stored hash is within ``threshold`` bits of the
+    query and was stored under the same namespace (site and camera):
+    featureless frames such as a blank sky or a covered lens all hash to
+    about 0, so without it one camera could be served another's cards.
+    Entries expire after ``ttl`` seconds and the least recently used
+    entry is evicted once ``max_entries`` is reached.
+    """
+
+    def __init__(self, max_entries=256, ttl=300.0, threshold=6, hash_size=8):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hash_size = hash_size
+        self._entries = OrderedDict()  # (namespace, hash) -> (stored_at, cards)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def hash(self, image_bytes, namespace=None):
+        """
+        Cache key for a frame: ``(namespace, dhash)``, or None if the image
+        cannot be hashed.
+        """
+        value = dhash(image_bytes, self.hash_size)
+        return None if value is None else (namespace, value)
+
+    def lookup(self, key):
+        """
+        Return cached cards for the nearest hash within the threshold in the
+        key's namespace, or None.
+        """
+        if key is None:
+            return None
+        namespace, value = key
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            best, best_dist = None, self.threshold + 1
+            for k in self._entries:
+                if k[0] != namespace:
+                    continue
+                d = hamming(k[1], value)
+                if d < best_dist:
+                    best, best_dist = k, d
+                    if d == 0:
+                        break
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            return self._entries[best][1]
+
+    def store(self, key, cards):
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = (time.time(), cards)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.available,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total) if total else 0.0,
+                'threshold': self.threshold,
+                'ttl': self.ttl,
+                'max_entries': self.max_entries,
+            }
+
+    def _expire(self, now):
+        # Entries are kept in recency order, not insertion time, so scan all
+        stale = [k for k, (t, _) in self._entries.items() if now - t > self.ttl]
+        for k in stale:
+            del self._entries[k]
@@ -0,0 +1,206 @@
+import re
+import bisect
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this to was were with'.split()
+)
+DAY = 86400
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(str(text).lower()) if t not in _STOPWORDS]
+
+
+def _insert(items, key):
+    # Runs nearly always arrive in time order; only back-dated ones pay for insort
+    if not items or items[-1] <= key:
+        items.append(key)
+    else:
+        bisect.insort(items, key)
+
+
+def _count(items, lo=None, hi=None):
+    """
+    Number of (ts, seq) keys with ``lo <= ts < hi``.
+    """
+    start = 0 if lo is None else bisect.bisect_left(items, (lo, -1))
+    end = len(items) if hi is None else bisect.bisect_left(items, (hi, -1))
+    return max(0, end - start)
+
+
+class HistoryIndex:
+    """
+    In-memory index over analysis runs for history queries.
+
+    Runs get a local sequence number in arrival order and are keyed by
+    ``(ts, seq)``. Every list in the index (all runs, each token's
+    postings, each site, each card title) is kept sorted by that key as
+    runs arrive, so a page is found by bisecting and walking backwards from
+    the cursor, and multi-term queries intersect lazily (leapfrog) instead
+    of materializing candidate sets. Per-title daily counts make day-sized
+    trend buckets independent of the number of runs. Full records are
+    loaded from the store only for returned pages.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = []
+        self._ts = []
+        self._by_time = []                   # sorted (ts, seq)
+        self._postings = defaultdict(list)   # token -> sorted (ts, seq)
+        self._sites = defaultdict(list)      # site -> sorted (ts, seq)
+        self._titles = defaultdict(list)     # normalized title -> sorted (ts, seq)
+        self._title_days = defaultdict(lambda: defaultdict(int))  # normalized title -> day start -> runs
+        self._title_names = {}               # normalized title -> display title
+
+    def build(self, store):
+        count = 0
+        for record in store.iter_records():
+            self.add(record)
+            count += 1
+        logger.info("History index built over %d runs", count)
+
+    def add(self, record):
+        ts = record.get('ts') or 0.0
+        tokens = set()
+        titles = set()
+        for card in record.get('cards') or []:
+            if not isinstance(card, dict):
+                continue
+            title = str(card.get('title', '')).strip()
+            tokens.update(tokenize(title))
+            tokens.update(tokenize(card.get('description', '')))
+            if title:
+                titles.add(title)
+        with self._lock:
+            seq = len(self._ids)
+            key = (ts, seq)
+            self._ids.append(record.get('id'))
+            self._ts.append(ts)
+            _insert(self._by_time, key)
+            for token in tokens:
+                _insert(self._postings[token], key)
+            if record.get('site') is not None:
+                _insert(self._sites[record['site']], key)
+            for name, display in {t.lower(): t for t in titles}.items():
+                _insert(self._titles[name], key)
+                self._title_days[name][int(ts // DAY) * DAY] += 1
+                self._title_names.setdefault(name, display)
+
+    def __len__(self):
+        return len(self._ids)
+
+    # -- queries ------------------------------------------------------------
+
+    def search(self, query=None, since=None, until=None, site=None, cursor=None, limit=50):
+        """
+        Newest-first page of run IDs matching all query tokens, the time
+        range and site. Returns ``(run_ids, next_cursor)``; pass the cursor
+        back to get the following page.
+        """
+        with self._lock:
+            lists = [self._postings.get(t, []) for t in set(tokenize(query))] if query else []
+            if site is not None:
+                lists.append(self._sites.get(site, []))
+            if not lists:
+                lists = [self._by_time]
+            hi = (float('inf'), 0) if until is None else (until, float('inf'))
+            if cursor is not None and 0 <= cursor < len(self._ts):
+                hi = min(hi, (self._ts[cursor], cursor))
+            lo = None if since is None else (since, -1)
+            out, next_cursor = [], None
+            for _, seq in self._intersect_desc(lists, lo, hi):
+                if len(out) == limit:
+                    next_cursor = out[-1]
+                    break
+                out.append(seq)
+            return [self._ids[seq] for seq in out], next_cursor
+
+    @staticmethod
+    def _intersect_desc(lists, lo, hi):
+        """
+        Yield keys present in every sorted list, newest first, with
+        ``lo <= key < hi``. The shortest list drives; the others are probed
+        by bisection and let the driver skip ahead (leapfrog join).
+        """
+        lists = sorted(lists, key=len)
+        driver, others = lists[0], lists[1:]
+        i = bisect.bisect_left(driver, hi) - 1
+        while i >= 0:
+            key = driver[i]
+            if lo is not None and key < lo:
+                return
+            for other in others:
+                j = bisect.bisect_right(other, key) - 1
+                if j < 0:
+                    return
+                if other[j] != key:
+                    # Nothing in ``other`` between other[j] and key: jump the driver down
+                    i = bisect.bisect_right(driver, other[j]) - 1
+                    break
+            else:
+                yield key
+                i -= 1
+
+    def titles(self, match=None):
+        """
+        Known card titles with how many runs contained them, optionally
+        filtered by a case-insensitive substring.
+        """
+        with self._lock:
+            needle = match.lower() if match else None
+            return sorted(
+                ({'title': self._title_names[key], 'runs': len(points)}
+                 for key, points in self._titles.items() if needle is None or needle in key),
+                key=lambda t: -t['runs'],
+            )
+
+    def trend(self, match, since=None, until=None, bucket=DAY, limit=100):
+        """
+        Time series for card titles containing ``match``: counts per
+        ``bucket`` seconds and the newest ``limit`` (ts, run_id, title)
+        points, oldest first.
+        """
+        needle = match.lower()
+        hi = None if until is None else until + 1e-6
+        with self._lock:
+            keys = [key for key in self._titles if needle in key]
+            buckets = defaultdict(int)
+            recent = []
+            for key in keys:
+                series = self._titles[key]
+                if bucket % DAY == 0:
+                    self._day_buckets(key, series, since, hi, bucket, buckets)
+                else:
+                    start = 0 if since is None else bisect.bisect_left(series, (since, -1))
+                    end = len(series) if hi is None else bisect.bisect_left(series, (hi, -1))
+                    for ts, _ in series[start:end]:
+                        buckets[int(ts // bucket) * bucket] += 1
+                if limit:
+                    end = len(series) if hi is None else bisect.bisect_left(series, (hi, -1))
+                    start = max(0, end - limit)
+                    name = self._title_names[key]
+                    recent.extend((ts, seq, name) for ts, seq in series[start:end] if since is None or ts >= since)
+            recent.sort()
+            recent = recent[-limit:] if limit else []
+            return {
+                'buckets': [{'start': start, 'count': buckets[start]} for start in sorted(buckets) if buckets[start]],
+                'points': [{'ts': ts, 'run_id': self._ids[seq], 'title': name} for ts, seq, name in recent],
+                'total': sum(buckets.values()),
+            }
+
+    def _day_buckets(self, key, series, since, hi, bucket, buckets):
+        # Whole days come from the running daily counts; only the days cut by since/until are counted from the series
+        for day, count in self._title_days[key].items():
+            if (since is not None and day + DAY <= since) or (hi is not None and day >= hi):
+                continue
+            if (since is not None and day < since) or (hi is not None and day + DAY > hi):
+                count = _count(series, max(day, since) if since is not None else day,
+                               min(day + DAY, hi) if hi is not None else day + DAY)
+            buckets[int(day // bucket) * bucket] += count
@@ -0,0 +1,185 @@
+import io
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    logger.warning("Pillow not installed; snapshots are forwarded without resizing")
+
+# Magic-number prefixes for formats the vision model accepts
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+
+class ImageRejected(ValueError):
+    """
+    Raised for snapshots that are empty, too large, or not a supported image.
+    ``status`` is the HTTP status the API should answer with.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_format(data):
+    """
+    Return the MIME type of ``data`` from its leading bytes, or None.
+    """
+    for magic, mime in _SIGNATURES:
+        if data.startswith(magic):
+            return mime
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def image_tokens(width, height, detail='high'):
+    """
+    Vision input tokens for an image of this size: 85 base tokens plus 170
+    per 512px tile after the API's own downscaling (fit in 2048x2048, then
+    shortest side at most 768).
+    """
+    if detail == 'low':
+        return 85
+    scale = min(1.0, 2048.0 / max(width, height))
+    w, h = width * scale, height * scale
+    scale = min(1.0, 768.0 / min(w, h))
+    w, h = w * scale, h * scale
+    return 85 + 170 * math.ceil(w / 512.0) * math.ceil(h / 512.0)
+
+
+def fit_to_budget(width, height, token_budget, max_dim):
+    """
+    Largest size with the same aspect ratio, no larger than the original or
+    ``max_dim``, whose token cost is within ``token_budget``.
+    """
+    scale = min(1.0, float(max_dim) / max(width, height))
+    w, h = max(1, int(width * scale)), max(1, int(height * scale))
+    while image_tokens(w, h) > token_budget and max(w, h) > 512:
+        # Shrink towards the next tile boundary along the longer side
+        longer = max(w, h)
+        target = 512 * (math.ceil(longer / 512.0) - 1)
+        factor = target / float(longer)
+        w, h = max(1, int(w * factor)), max(1, int(h * factor))
+    return w, h
+
+
+def parse_roi(value):
+    """
+    Parse a region of interest ``"x,y,w,h"`` given as fractions of the
+    frame (0..1). Returns a tuple or None; raises ImageRejected if malformed.
+    """
+    if not value:
+        return None
+    try:
+        x, y, w, h = (float(v) for v in value.split(','))
+    except ValueError:
+        raise ImageRejected("roi must be 'x,y,w,h' fractions")
+    if not (0 <= x < 1 and 0 <= y < 1 and 0 < w <= 1 and 0 < h <= 1):
+        raise ImageRejected("roi values must be fractions within the frame")
+    return x, y, min(w, 1 - x), min(h, 1 - y)
+
+
+class ImageNormalizer:
+    """
+    Turns uploaded snapshots into bounded JPEGs for the model: sniff the
+    format, decode once, apply EXIF orientation and an optional ROI crop,
+    downscale to the token budget and re-encode. JPEGs that already fit and
+    need no crop are passed through unchanged.
+    """
+
+    def __init__(self, max_bytes=10 * 1024 * 1024, max_pixels=40_000_000, token_budget=765,
+                 max_dim=1536, quality=80):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.token_budget = token_budget
+        self.max_dim = max_dim
+        self.quality = quality
+
+    @property
+    def detail(self):
+        # Below a single high-detail tile the fixed-cost low-detail mode is cheaper
+        return 'low' if self.token_budget < 255 else 'high'
+
+    def check_size(self, length):
+        if length is not None and length > self.max_bytes:
+            raise ImageRejected(f"Snapshot exceeds {self.max_bytes} bytes", status=413)
+
+    def normalize(self, data, roi=None):
+        """
+        Return ``(jpeg_bytes, info)``; raises ImageRejected for bad input.
+        """
+        if not data:
+            raise ImageRejected("Empty snapshot")
+        self.check_size(len(data))
+        mime = sniff_format(data)
+        if mime is None:
+            raise ImageRejected("Unsupported image format", status=415)
+        if Image is None:
+            return data, {'format': mime, 'passthrough': True, 'bytes': len(data)}
+        try:
+            img = Image.open(io.BytesIO(data))
+            width, height = img.size
+        except Exception as e:
+            logger.debug("normalize: decode failed: %s", e)
+            raise ImageRejected("Could not decode snapshot")
+        if width * height > self.max_pixels:
+            raise ImageRejected(f"Snapshot has too many pixels ({width}x{height})", status=413)
+        orientation = 1
+        try:
+            orientation = img.getexif().get(0x0112, 1) or 1
+        except Exception:
+            pass
+        # Orientations 5-8 rotate by 90 degrees; size the output for the upright frame
+        upright_w, upright_h = (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+        max_dim = 512 if self.detail == 'low' else self.max_dim
+        crop_w, crop_h = upright_w, upright_h
+        if roi is not None:
+            crop_w, crop_h = max(1, int(roi[2] * upright_w)), max(1, int(roi[3] * upright_h))
+        target = fit_to_budget(crop_w, crop_h, self.token_budget if self.detail == 'high' else 10 ** 9, max_dim)
+        if mime == 'image/jpeg' and roi is None and target == (width, height) and orientation == 1:
+            # open() only read the header; decode fully so truncated or corrupt JPEGs are still rejected
+            try:
+                img.load()
+            except Exception as e:
+                logger.debug("normalize: decode failed: %s", e)
+                raise ImageRejected("Could not decode snapshot")
+            return data, {'format': mime, 'passthrough': True, 'size': (width, height), 'bytes': len(data)}
+        try:
+            if mime == 'image/jpeg' and roi is None and orientation == 1:
+                # Let libjpeg decode at a reduced scale when we are downsizing anyway
+                img.draft('RGB', target)
+            img = ImageOps.exif_transpose(img)
+            if roi is not None:
+                w, h = img.size
+                box = (int(roi[0] * w), int(roi[1] * h), int((roi[0] + roi[2]) * w), int((roi[1] + roi[3]) * h))
+                img = img.crop(box)
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            if img.size != target:
+                img = img.resize(target, Image.BILINEAR)
+            out = io.BytesIO()
+            img.save(out, 'JPEG', quality=self.quality)
+        except ImageRejected:
+            raise
+        except Exception as e:
+            logger.debug("normalize: decode failed: %s", e)
+            raise ImageRejected("Could not decode snapshot")
+        jpeg = out.getvalue()
+        return jpeg, {
+            'format': mime,
+            'passthrough': False,
+            'size': img.size,
+            'original_size': (width, height),
+            'bytes': len(jpeg),
+            'tokens': image_tokens(*img.size, detail=self.detail),
+        }
@@ -0,0 +1,241 @@
+import io
+import time
+import logging
+import threading
+import subprocess
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image, ImageChops, ImageStat
+except ImportError:
+    Image = None
+    logger.warning("Pillow not installed; ingestion falls back to fixed-interval sampling")
+
+SOI = b'\xff\xd8'
+EOI = b'\xff\xd9'
+
+
+def split_jpegs(stream, chunk_size=64 * 1024):
+    """
+    Yield individual JPEG images from a byte stream of concatenated JPEGs
+    (ffmpeg's image2pipe/mjpeg output, or an .mjpeg file).
+    """
+    buf = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buf += chunk
+        while True:
+            start = buf.find(SOI)
+            if start < 0:
+                buf = buf[-1:]
+                break
+            end = buf.find(EOI, start + 2)
+            if end < 0:
+                buf = buf[start:]
+                break
+            yield buf[start:end + 2]
+            buf = buf[end + 2:]
+
+
+def thumbnail(image_bytes, size=32):
+    """
+    Decode to a small grayscale thumbnail used for scene-change scoring.
+    """
+    if Image is None:
+        return None
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        img.draft('L', (size * 4, size * 4))
+        return img.convert('L').resize((size, size), Image.BILINEAR)
+    except Exception as e:
+        logger.debug("thumbnail: could not decode frame: %s", e)
+        return None
+
+
+def scene_score(prev, cur):
+    """
+    Mean absolute pixel difference between two thumbnails, in [0, 1].
+    """
+    if prev is None or cur is None:
+        return 1.0
+    diff = ImageChops.difference(prev, cur)
+    return ImageStat.Stat(diff).mean[0] / 255.0
+
+
+class StreamIngester:
+    """
+    Background worker that pulls frames from a live stream (FLV/HLS/RTMP via
+    ffmpeg), a local video file, or a concatenated-JPEG file, and feeds
+    selected frames to ``process(image_bytes, site)``; a None result
+    counts the frame as skipped (nothing was saved).
+
+    A frame is selected when at least ``min_interval`` seconds have passed
+    since the last selected frame and its scene score against that frame is
+    at least ``threshold``, or unconditionally once ``max_interval`` seconds
+    have passed. Selected frames go through a bounded queue; when analysis
+    falls behind, the oldest pending frame is dropped.
+    """
+
+    def __init__(self, source, process, site=None, min_interval=2.0, max_interval=30.0,
+                 threshold=0.08, queue_size=4, sample_fps=2.0, ffmpeg='ffmpeg'):
+        self.source = source
+        self.process = process
+        self.site = site
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.threshold = threshold
+        self.sample_fps = sample_fps
+        self.ffmpeg = ffmpeg
+        self._queue = deque(maxlen=queue_size)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._proc = None
+        self.frames_seen = 0
+        self.frames_selected = 0
+        self.frames_dropped = 0
+        self.frames_analyzed = 0
+        self.frames_skipped = 0
+        self.errors = 0
+        self.last_score = None
+        self.last_selected_at = None
+
+    @property
+    def is_live(self):
+        return self.source.split('://', 1)[0] in ('http', 'https', 'rtmp', 'rtsp', 'srt')
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for target, name in ((self._read_loop, 'ingest-reader'), (self._analyze_loop, 'ingest-analyzer')):
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info("Stream ingestion started from %s", self.source)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+        with self._cond:
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def stats(self):
+        return {
+            'source': self.source,
+            'running': any(t.is_alive() for t in self._threads),
+            'frames_seen': self.frames_seen,
+            'frames_selected': self.frames_selected,
+            'frames_dropped': self.frames_dropped,
+            'frames_analyzed': self.frames_analyzed,
+            'frames_skipped': self.frames_skipped,
+            'errors': self.errors,
+            'queue_depth': len(self._queue),
+            'last_score': self.last_score,
+            'last_selected_at': self.last_selected_at,
+        }
+
+    # -- frame sources ------------------------------------------------------
+
+    def _frames(self):
+        if self.source.lower().endswith(('.mjpg', '.mjpeg')):
+            # Concatenated JPEGs (test fixtures): pace at sample_fps
+            delay = 1.0 / self.sample_fps if self.sample_fps else 0
+            with open(self.source, 'rb') as f:
+                for frame in split_jpegs(f):
+                    yield frame
+                    if self._stop.wait(delay):
+                        return
+            return
+        cmd = [self.ffmpeg, '-hide_banner', '-loglevel', 'error']
+        if not self.is_live:
+            # Read local files at native rate so intervals mean the same thing
+            cmd.append('-re')
+        cmd += ['-i', self.source, '-vf', f'fps={self.sample_fps}', '-f', 'image2pipe',
+                '-vcodec', 'mjpeg', '-q:v', '3', '-']
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL)
+        try:
+            for frame in split_jpegs(self._proc.stdout):
+                yield frame
+        finally:
+            if self._proc.poll() is None:
+                self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+
+    # -- worker loops -------------------------------------------------------
+
+    def _read_loop(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                self._sample(self._frames())
+                backoff = 1.0
+            except Exception as e:
+                self.errors += 1
+                logger.error("Stream ingestion read error: %s", e, exc_info=True)
+            if not self.is_live or self._stop.is_set():
+                break
+            # Live source ended or failed: reconnect with capped backoff
+            logger.warning("Stream %s ended; reconnecting in %.0fs", self.source, backoff)
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+        with self._cond:
+            self._cond.notify_all()
+
+    def _sample(self, frames):
+        ref = None
+        last_at = None
+        for frame in frames:
+            if self._stop.is_set():
+                return
+            self.frames_seen += 1
+            now = time.monotonic()
+            elapsed = None if last_at is None else now - last_at
+            if elapsed is not None and elapsed < self.min_interval:
+                continue
+            thumb = thumbnail(frame)
+            score = scene_score(ref, thumb) if Image is not None else 0.0
+            self.last_score = score
+            if elapsed is not None and elapsed < self.max_interval and score < self.threshold:
+                continue
+            ref, last_at = thumb, now
+            self.last_selected_at = time.time()
+            self.frames_selected += 1
+            self._enqueue(frame)
+
+    def _enqueue(self, frame):
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.frames_dropped += 1
+            # deque(maxlen) discards the oldest item on overflow
+            self._queue.append(frame)
+            self._cond.notify()
+
+    def _analyze_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stop.is_set():
+                    if not any(t.is_alive() for t in self._threads[:1]):
+                        return
+                    self._cond.wait(1.0)
+                if self._stop.is_set():
+                    return
+                frame = self._queue.popleft()
+            try:
+                if self.process(frame, self.site) is None:
+                    self.frames_skipped += 1
+                else:
+                    self.frames_analyzed += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error("Stream ingestion analysis error: %s", e, exc_info=True)
@@ -0,0 +1,203 @@
+import time
+import uuid
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """
+    Raised by JobQueue.submit when the pool and its backlog are saturated.
+    """
+
+
+class Job:
+    """
+    One unit of background work and its outcome.
+    """
+
+    def __init__(self, kind, meta=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.meta = meta or {}
+        self.status = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.deadline = None
+        self.timeout = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+        data.update(self.meta)
+        if self.status == 'done':
+            data['result'] = self.result
+        elif self.error:
+            data['error'] = self.error
+        return data
+
+
+class JobQueue:
+    """
+    Bounded thread pool for slow work such as model calls.
+
+    At most ``workers`` jobs run at once and at most ``max_pending`` more may
+    wait; beyond that ``submit`` raises QueueFull. A job still running after
+    ``timeout`` seconds (or the per-job ``timeout`` passed to ``submit``) is
+    reported as ``timeout`` and its eventual result is
+    discarded (the callable should also bound its own I/O). Finished jobs are
+    kept for ``retention`` seconds so clients can poll them.
+    """
+
+    def __init__(self, workers=4, max_pending=16, timeout=60.0, retention=600.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._active = 0
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.rejected = 0
+
+    def submit(self, kind, fn, *args, meta=None, timeout=None, **kwargs):
+        job = Job(kind, meta)
+        job.timeout = timeout
+        with self._lock:
+            self._prune()
+            if self._active >= self.workers + self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"{self._active} jobs in flight")
+            self._active += 1
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            self._check_deadline(job)
+        return job
+
+    def wait(self, job, timeout=None):
+        """
+        Block until ``job`` finishes or its deadline passes; return the job.
+        """
+        limit = timeout or job.timeout or self.timeout
+        end = time.time() + limit
+        while not job.done.is_set():
+            # Deadline is only known once the job starts running
+            remaining = (job.deadline or end) - time.time()
+            if remaining <= 0 or time.time() >= end:
+                break
+            job.done.wait(min(remaining, 0.5))
+        self._check_deadline(job, force=not job.done.is_set())
+        return job
+
+    def subscribe(self, maxsize=100):
+        """
+        Return a queue that receives ``job.to_dict()`` for every finished job.
+        """
+        q = queue.Queue(maxsize=maxsize)
+        with self._lock:
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'in_flight': self._active,
+                'completed': self.completed,
+                'failed': self.failed,
+                'timed_out': self.timed_out,
+                'rejected': self.rejected,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    # -- internals ----------------------------------------------------------
+
+    def _run(self, job, fn, args, kwargs):
+        if job.done.is_set():
+            # Timed out while still queued; don't spend a worker on it
+            with self._lock:
+                self._active -= 1
+            return
+        job.started = time.time()
+        job.deadline = job.started + (job.timeout or self.timeout)
+        job.status = 'running'
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            logger.error("Job %s (%s) failed: %s", job.id, job.kind, e, exc_info=True)
+            self._finish(job, 'failed', error=str(e))
+        else:
+            if time.time() > job.deadline:
+                self._finish(job, 'timeout', error='Job exceeded its deadline')
+            else:
+                self._finish(job, 'done', result=result)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _check_deadline(self, job, force=False):
+        if job.done.is_set():
+            return
+        if force or (job.deadline is not None and time.time() > job.deadline):
+            self._finish(job, 'timeout', error='Job exceeded its deadline')
+
+    def _finish(self, job, status, result=None, error=None):
+        with self._lock:
+            if job.done.is_set():
+                return
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished = time.time()
+            job.done.set()
+            if status == 'done':
+                self.completed += 1
+            elif status == 'timeout':
+                self.timed_out += 1
+            else:
+                self.failed += 1
+            subscribers = list(self._subscribers)
+        event = job.to_dict()
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Slow subscriber: drop the event rather than block workers
+                pass
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        stale = [jid for jid, j in self._jobs.items() if j.finished and j.finished < cutoff]
+        for jid in stale:
+            del self._jobs[jid]
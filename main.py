@@ -1,15 +1,28 @@
 import os
-import io
 import json
 import base64
+import math
 import logging
-from flask import Flask, jsonify, send_file, request, send_from_directory
-from reportlab.pdfgen import canvas
+import time
+import queue
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, g, jsonify, request, send_from_directory, stream_with_context
 from dotenv import load_dotenv
-import re
-from PyPDF2 import PdfReader, PdfWriter
 import requests
-from openai import OpenAI
+from openai import APITimeoutError, OpenAI
+from run_store import RunStore
+from frame_cache import FrameCache, hamming
+from ingest import StreamIngester
+from jobs import JobQueue, QueueFull
+from card_stream import CardStreamParser, parse_batch_cards, strip_code_fences
+from report import ReportEngine, parse_time, iter_chunks
+from metrics import Metrics
+from history import HistoryIndex
+from response_cache import VersionedCache, normalize_question
+from resilience import CallPolicy, CircuitBreaker, CircuitOpen, DeadlineExceeded, HedgePool
+from imaging import ImageNormalizer, ImageRejected, parse_roi, sniff_format
 
 # Load environment and configure
 # Load environment and configure
@@ -26,11 +39,38 @@ os.makedirs(DEBUG_DIR, exist_ok=True)
 # Data directory for storing analysis results
 DATA_DIR = os.getenv('DATA_DIR', 'data')
 os.makedirs(DATA_DIR, exist_ok=True)
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Default site tag for runs that don't specify one
+SITE_ID = os.getenv('SITE_ID')
+# Configure logging (LOG_LEVEL=DEBUG for verbose tracing)
+LOG_LEVEL = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+# Fraction of requests whose payloads (card arrays, raw model output) are logged at DEBUG
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 0.01))
+logging.basicConfig(level=LOG_LEVEL)
 
 app = Flask(__name__, static_folder='static')
-app.logger.setLevel(logging.DEBUG)
+app.logger.setLevel(LOG_LEVEL)
+
+def _log_payload():
+    return app.logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_SAMPLE_RATE
+
+# In-process latency histograms and counters, exposed at /metrics
+METRICS = Metrics(prefix='potemkin')
+METRICS.describe('stage_seconds', 'Time spent in each processing stage')
+METRICS.describe('request_seconds', 'HTTP request handling time by endpoint')
+METRICS.describe('requests_total', 'HTTP requests by endpoint, method and status')
+METRICS.describe('errors_total', 'Errors by stage')
+METRICS.describe('stub_fallbacks_total', 'Analyses answered with STUB_DATA after a model failure')
+METRICS.describe('cache_hits_total', 'Cache hits by cache')
+METRICS.describe('cache_misses_total', 'Cache misses by cache')
+
+def stage(name):
+    """
+    Time a processing stage into potemkin_stage_seconds{stage=name}.
+    """
+    return METRICS.timer('stage_seconds', errors='errors_total', stage=name)
+
+# Append-only run history (migrates data/last_analysis.json on first start)
+RUN_STORE = RunStore(DATA_DIR, segment_max_bytes=int(os.getenv('RUN_SEGMENT_MAX_BYTES', 64 * 1024 * 1024)))
 
 STUB_DATA = [
     {"title": "BUILDING", "description": "40% completed. Last floor progress updated 2h ago."},
@@ -51,89 +91,673 @@ except Exception as _e:
         "Do not include any additional text, commentary, or markdown—only the JSON array."
     )
 
-def analyze_image_openai(image_bytes):
+# Snapshot preprocessing: bounded size and token cost regardless of which client uploaded it
+IMAGES = ImageNormalizer(
+    max_bytes=int(os.getenv('IMAGE_MAX_BYTES', 10 * 1024 * 1024)),
+    max_pixels=int(os.getenv('IMAGE_MAX_PIXELS', 40_000_000)),
+    token_budget=int(os.getenv('IMAGE_TOKEN_BUDGET', 765)),
+    max_dim=int(os.getenv('IMAGE_MAX_DIM', 1536)),
+    quality=int(os.getenv('IMAGE_JPEG_QUALITY', 80)),
+)
+IMAGE_ROI = os.getenv('IMAGE_ROI', '')
+
+def prepare_snapshot(img_bytes, roi=None):
+    """
+    Validate and normalize an uploaded snapshot; raises ImageRejected.
+    """
+    with stage('image_normalize'):
+        data, info = IMAGES.normalize(img_bytes, roi=parse_roi(roi or IMAGE_ROI))
+    app.logger.debug("Snapshot normalized: %s", info)
+    return data
+
+def _request_flag(name):
+    return (request.form.get(name) or request.args.get(name) or '').lower() in ('1', 'true', 'yes')
+
+def _read_snapshot(file, roi=None):
+    """
+    Read and normalize an uploaded snapshot file from the current request.
+    """
+    with stage('upload_read'):
+        img_bytes = file.read(IMAGES.max_bytes + 1)
+    return prepare_snapshot(img_bytes, roi=roi or request.form.get('roi') or request.args.get('roi'))
+
+def _check_upload_length():
+    # Reject before Flask parses (and buffers) the multipart body; allow for form overhead
+    if request.content_length and request.content_length > IMAGES.max_bytes + 64 * 1024:
+        raise ImageRejected(f"Snapshot exceeds {IMAGES.max_bytes} bytes", status=413)
+
+def _rejected(e):
+    METRICS.inc('rejected_snapshots_total', status=e.status)
+    return jsonify({'error': str(e)}), e.status
+
+# One process-wide OpenAI client; its pooled HTTP transport keeps connections alive across calls
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 60))
+# SDK-level retries default off: CallPolicy below retries within each endpoint's deadline
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 0))
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+def get_openai_client():
+    """
+    Return the shared OpenAI client, creating it on first use.
+    """
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                _openai_client = OpenAI(timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES)
+    return _openai_client
+
+# Shared HTTP session for other outbound calls (realtime session minting)
+HTTP_SESSION = requests.Session()
+REALTIME_SESSIONS_URL = os.getenv('OPENAI_REALTIME_SESSIONS_URL', 'https://api.openai.com/v1/realtime/sessions')
+
+# Outbound call resilience: one breaker per upstream, a deadline/retry/hedge policy per endpoint
+def _retryable(e):
+    """
+    Network errors, timeouts, 429 and 5xx are worth retrying; other HTTP errors are not.
+    """
+    status = getattr(e, 'status_code', None)
+    if status is None and getattr(e, 'response', None) is not None:
+        status = getattr(e.response, 'status_code', None)
+    return status is None or status == 429 or status >= 500
+
+def _is_timeout(e):
+    return isinstance(e, (TimeoutError, requests.Timeout, APITimeoutError))
+
+def _breaker(name):
+    return CircuitBreaker(
+        name,
+        window=int(os.getenv('BREAKER_WINDOW', 20)),
+        min_calls=int(os.getenv('BREAKER_MIN_CALLS', 5)),
+        failure_threshold=float(os.getenv('BREAKER_FAILURE_RATE', 0.5)),
+        cooldown=float(os.getenv('BREAKER_COOLDOWN', 30)),
+    )
+
+BREAKERS = {name: _breaker(name) for name in ('openai_chat', 'openai_realtime')}
+OUTBOUND_RETRIES = int(os.getenv('OUTBOUND_RETRIES', 1))
+HEDGE_AFTER = float(os.getenv('HEDGE_AFTER', 0))
+HEDGE_POOL = HedgePool(int(os.getenv('HEDGE_WORKERS', 8)))
+
+def _policy(name, breaker, deadline, hedge=True):
+    return CallPolicy(
+        name,
+        BREAKERS[breaker],
+        deadline=float(os.getenv(f'DEADLINE_{name.upper()}', deadline)),
+        retries=OUTBOUND_RETRIES,
+        hedge_after=float(os.getenv(f'HEDGE_AFTER_{name.upper()}', HEDGE_AFTER)) if hedge else None,
+        retryable=_retryable,
+        is_timeout=_is_timeout,
+        hedge_pool=HEDGE_POOL,
+    )
+
+POLICIES = {
+    'analysis': _policy('analysis', 'openai_chat', 45),
+    # A stream can't be hedged once cards have gone out
+    'analysis_stream': _policy('analysis_stream', 'openai_chat', 60, hedge=False),
+    'batch': _policy('batch', 'openai_chat', 120),
+    'voice': _policy('voice', 'openai_chat', 20),
+    'session': _policy('session', 'openai_realtime', 10),
+}
+
+def _unavailable(e):
+    """
+    Response for an outbound call that was short-circuited or ran out of time.
+    """
+    if isinstance(e, CircuitOpen):
+        return jsonify({'error': 'AI provider unavailable, retry later'}), 503, {'Retry-After': str(max(1, math.ceil(e.retry_after)))}
+    return jsonify({'error': 'AI provider timed out'}), 504
+
+def _image_part(image_bytes):
+    with stage('base64_encode'):
+        b64 = base64.b64encode(image_bytes).decode('utf-8')
+    data_url = f"data:{sniff_format(image_bytes) or 'image/jpeg'};base64,{b64}"
+    return {"type": "image_url", "image_url": {"url": data_url, "detail": IMAGES.detail}}
+
+def _image_messages(image_bytes):
     """
-    Analyze an image using OpenAI's multimodal ChatCompletion API.
+    Build the chat messages for analyzing one image.
     """
-    client = OpenAI()
-    b64 = base64.b64encode(image_bytes).decode('utf-8')
-    data_url = f"data:image/jpeg;base64,{b64}"
     system_prompt = IMAGE_ANALYSIS_INSTRUCTION
     user_message = {
         "role": "user",
         "content": [
             {"type": "text", "text": "Analyze the following image and produce analysis cards:"},
-            {"type": "image_url", "image_url": {"url": data_url}}
+            _image_part(image_bytes)
         ]
     }
+    return [{"role": "system", "content": system_prompt}, user_message]
+
+BATCH_INSTRUCTION = (
+    "You will receive {n} images, each preceded by a label 'Frame <k>'. "
+    "Analyze every frame independently. Respond with only a JSON array containing one object per frame, "
+    "in the form {{\"frame\": <k>, \"cards\": [{{\"title\": ..., \"description\": ...}}, ...]}}."
+)
+
+def analyze_images_openai(frames):
+    """
+    Analyze several images in one multimodal call. ``frames`` is a list of
+    ``(image_bytes, label)``; returns one card list (or None when the
+    reply omitted that frame) per frame, or None if the call itself failed.
+    """
+    client = get_openai_client()
+    content = [{"type": "text", "text": BATCH_INSTRUCTION.format(n=len(frames))}]
+    for k, (image_bytes, label) in enumerate(frames, start=1):
+        content.append({"type": "text", "text": f"Frame {k}" + (f" ({label})" if label else "")})
+        content.append(_image_part(image_bytes))
+    messages = [{"role": "system", "content": IMAGE_ANALYSIS_INSTRUCTION}, {"role": "user", "content": content}]
+    try:
+        with stage('model_call_batch'):
+            completion = POLICIES['batch'].call(lambda timeout: client.chat.completions.create(
+                model=os.getenv("OPENAI_MODEL", "gpt-4.1"),
+                messages=messages,
+                timeout=timeout,
+            ))
+    except CircuitOpen as e:
+        app.logger.warning("analyze_images_openai skipped (%d frames): %s", len(frames), e)
+        return None
+    except Exception as e:
+        app.logger.error("analyze_images_openai API error (%d frames): %s", len(frames), e, exc_info=True)
+        return None
+    text = completion.choices[0].message.content or ""
+    with stage('json_parse'):
+        return parse_batch_cards(text, len(frames))
+
+def analyze_image_openai(image_bytes, fallback=STUB_DATA):
+    """
+    Analyze an image using OpenAI's multimodal ChatCompletion API. Returns
+    ``fallback`` (the stub cards by default) when the call fails.
+    """
+    client = get_openai_client()
+    messages = _image_messages(image_bytes)
     # Call OpenAI chat completion
     try:
-        completion = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL", "gpt-4.1"),
-            messages=[{"role": "system", "content": system_prompt}, user_message],
-        )
+        with stage('model_call'):
+            completion = POLICIES['analysis'].call(lambda timeout: client.chat.completions.create(
+                model=os.getenv("OPENAI_MODEL", "gpt-4.1"),
+                messages=messages,
+                timeout=timeout,
+            ))
+    except CircuitOpen as e:
+        app.logger.warning("analyze_image_openai skipped: %s", e)
+        if fallback is STUB_DATA:
+            METRICS.inc('stub_fallbacks_total')
+        return fallback
     except Exception as e:
         app.logger.error("analyze_image_openai API error: %s", e, exc_info=True)
-        return STUB_DATA
+        if fallback is STUB_DATA:
+            METRICS.inc('stub_fallbacks_total')
+        return fallback
     # Extract content
     content = completion.choices[0].message.content
-    app.logger.debug("analyze_image_openai: raw content: %s", content)
+    if _log_payload():
+        app.logger.debug("analyze_image_openai: raw content: %s", content)
     text = content if isinstance(content, str) else ""
     # Attempt to parse JSON; if that fails, return raw text as a single card
-    json_text = re.sub(r"```json", "", text)
-    json_text = re.sub(r"```", "", json_text).strip()
     try:
-        cards = json.loads(json_text)
+        with stage('json_parse'):
+            cards = json.loads(strip_code_fences(text))
         return cards
     except Exception as e:
-        app.logger.error("analyze_image_openai JSON parse error: %s", e, exc_info=True)
+        app.logger.warning("analyze_image_openai JSON parse error: %s", e)
         return [{"title": "Analysis", "description": text}]
 
+def analyze_image_openai_stream(image_bytes, on_card=None):
+    """
+    Streaming variant of analyze_image_openai: cards are parsed as soon as
+    each JSON object closes and passed to ``on_card``. Returns
+    ``(cards, complete)``; if the stream drops or ends inside the array,
+    the cards received so far are returned with ``complete=False``.
+    """
+    client = get_openai_client()
+    messages = _image_messages(image_bytes)
+    parser = CardStreamParser()
+    policy = POLICIES['analysis_stream']
+    started = time.perf_counter()
+    stream = None
+    try:
+        with stage('model_call_stream'):
+            # Retries and the breaker cover opening the stream; the deadline covers the whole read
+            stream = policy.call(lambda timeout: client.chat.completions.create(
+                model=os.getenv("OPENAI_MODEL", "gpt-4.1"),
+                messages=messages,
+                stream=True,
+                timeout=timeout,
+            ))
+            for chunk in stream:
+                if time.perf_counter() - started > policy.deadline:
+                    raise DeadlineExceeded(f"analysis_stream: deadline of {policy.deadline}s exceeded")
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                for card in parser.feed(delta or ''):
+                    if len(parser.cards) == 1:
+                        # Time to first card, the latency the user actually sees
+                        METRICS.observe('stage_seconds', time.perf_counter() - started, stage='model_first_card')
+                    if on_card is not None:
+                        on_card(card)
+    except Exception as e:
+        if isinstance(e, CircuitOpen):
+            app.logger.warning("analyze_image_openai_stream skipped: %s", e)
+        else:
+            app.logger.error("analyze_image_openai_stream error after %d cards: %s", len(parser.cards), e, exc_info=True)
+        if stream is not None:
+            # Failed mid-stream: count it against the provider and release the connection
+            policy.breaker.record(False)
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+        if not parser.cards:
+            METRICS.inc('stub_fallbacks_total')
+        return (parser.cards or STUB_DATA), False
+    if _log_payload():
+        app.logger.debug("analyze_image_openai_stream: raw content: %s", parser.text)
+    if not parser.cards:
+        # Model answered in prose (brackets in prose yield no cards); keep it as a single card
+        card = {"title": "Analysis", "description": parser.text.strip()}
+        if on_card is not None:
+            on_card(card)
+        return [card], True
+    # An array still open when the stream ended is partial: don't let it be cached
+    return parser.cards, parser.finished
+
+def _env_flag(name, default):
+    return os.getenv(name, default).strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Near-duplicate frame cache in front of the model (hovering drones resend the same view)
+FRAME_CACHE_ENABLED = _env_flag('FRAME_CACHE_ENABLED', '1')
+FRAME_CACHE = FrameCache(
+    max_entries=int(os.getenv('FRAME_CACHE_SIZE', 256)),
+    ttl=float(os.getenv('FRAME_CACHE_TTL', 300)),
+    threshold=int(os.getenv('FRAME_CACHE_THRESHOLD', 6)),
+)
+
+def _frame_namespace(site=None, camera=None):
+    # Near-duplicates only count within one site and camera
+    return (site or SITE_ID, camera)
+
+def analyze_image_cached(image_bytes, site=None, bypass=False):
+    """
+    Return cards for a near-duplicate frame from the same site from the
+    cache, otherwise call analyze_image_openai and remember the result.
+    """
+    if bypass or not FRAME_CACHE_ENABLED:
+        return analyze_image_openai(image_bytes)
+    key = FRAME_CACHE.hash(image_bytes, _frame_namespace(site))
+    cached = FRAME_CACHE.lookup(key)
+    _count_cache('frame', cached is not None)
+    if cached is not None:
+        app.logger.debug("Frame cache hit (hash=%s)", key)
+        return cached
+    cards = analyze_image_openai(image_bytes)
+    # Don't pin the stub fallback from a failed call
+    if cards is not STUB_DATA:
+        FRAME_CACHE.store(key, cards)
+    return cards
+
+def _count_cache(cache, hit):
+    METRICS.inc('cache_hits_total' if hit else 'cache_misses_total', cache=cache)
+
+def process_snapshot(img_bytes, site=None, bypass=False):
+    """
+    Analyze one snapshot and persist it as a run. Shared by the upload
+    endpoint and the stream ingestion worker.
+    """
+    cards = analyze_image_cached(img_bytes, site=site, bypass=bypass)
+    _persist_run(cards, site)
+    return cards
+
+def ingest_frame(frame, site=None):
+    """
+    Ingestion worker callback. Unlike an upload nobody sees the reply, so
+    a failed model call saves nothing instead of persisting the stub cards.
+    """
+    cards = analyze_image_cached(prepare_snapshot(frame), site=site)
+    if cards is STUB_DATA:
+        app.logger.warning("Ingested frame not saved: model call failed")
+        return None
+    _persist_run(cards, site)
+    return cards
+
+def stream_snapshot(img_bytes, sink, site=None, bypass=False):
+    """
+    Streaming counterpart of process_snapshot: pushes ('card', card) events
+    into ``sink`` as they are parsed, then persists the run and pushes
+    ('done', {...}). Runs to completion even if nobody is reading the sink.
+    """
+    key = None
+    if not bypass and FRAME_CACHE_ENABLED:
+        key = FRAME_CACHE.hash(img_bytes, _frame_namespace(site))
+        cached = FRAME_CACHE.lookup(key)
+        _count_cache('frame', cached is not None)
+        if cached is not None:
+            for card in cached:
+                sink.put(('card', card))
+            run = _persist_run(cached, site)
+            sink.put(('done', {'run_id': run and run['id'], 'cards': cached, 'cached': True}))
+            return cached
+    try:
+        cards, complete = analyze_image_openai_stream(img_bytes, on_card=lambda card: sink.put(('card', card)))
+        if cards is STUB_DATA:
+            for card in cards:
+                sink.put(('card', card))
+        elif complete and key is not None:
+            FRAME_CACHE.store(key, cards)
+        run = _persist_run(cards, site)
+        sink.put(('done', {'run_id': run and run['id'], 'cards': cards, 'cached': False}))
+        return cards
+    except Exception as e:
+        sink.put(('error', {'error': str(e)}))
+        raise
+
+def _persist_run(cards, site=None):
+    try:
+        with stage('persist'):
+            run = RUN_STORE.append(cards, site=site or SITE_ID)
+        app.logger.debug("Saved analysis run %s. Total runs: %d", run['id'], len(RUN_STORE))
+        return run
+    except Exception as e:
+        app.logger.error("Failed to save analysis data: %s", e)
+        return None
+
+# Batch analysis: frames packed into as few multimodal calls as the model's image limit allows
+BATCH_MAX_IMAGES_PER_CALL = int(os.getenv('BATCH_MAX_IMAGES_PER_CALL', 8))
+BATCH_MAX_FRAMES = int(os.getenv('BATCH_MAX_FRAMES', 500))
+BATCH_MAX_BYTES = int(os.getenv('BATCH_MAX_BYTES', 512 * 1024 * 1024))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 4))
+BATCH_JOB_TIMEOUT = float(os.getenv('BATCH_JOB_TIMEOUT', 900))
+
+def _frame_label(frame):
+    parts = [frame.get('camera'), frame.get('site')]
+    if frame.get('ts') is not None:
+        parts.append(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(frame['ts'])))
+    return ', '.join(str(p) for p in parts if p)
+
+def _batch_frame_meta(info, default_site=None):
+    """
+    Validate one item of the batch ``meta`` array; returns ``(ts, roi,
+    site, camera)`` or raises ValueError so only that frame is rejected.
+    """
+    ts = parse_time(info.get('ts'))
+    if ts is not None:
+        try:
+            time.localtime(ts)
+        except (OverflowError, OSError) as e:
+            raise ValueError(f"ts out of range: {e}")
+    fields = {}
+    for name in ('roi', 'site', 'camera'):
+        value = info.get(name)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{name} must be a string")
+        fields[name] = value
+    return ts, fields['roi'], fields['site'] or default_site, fields['camera']
+
+def _group_duplicates(pending, keys):
+    """
+    Split pending frame indexes into one representative per group of
+    near-duplicates and ``{representative: [duplicates]}``; frames without
+    a cache key are never grouped.
+    """
+    representatives, duplicates = [], {}
+    for i in pending:
+        key = keys[i]
+        if key is not None:
+            match = next((r for r in representatives if keys[r] is not None and keys[r][0] == key[0]
+                          and hamming(keys[r][1], key[1]) <= FRAME_CACHE.threshold), None)
+            if match is not None:
+                duplicates.setdefault(match, []).append(i)
+                continue
+        representatives.append(i)
+    return representatives, duplicates
+
+def process_batch(frames, bypass=False):
+    """
+    Analyze a batch of frames (dicts with ``image`` and optional ``filename``,
+    ``ts``, ``site``, ``camera``) and persist them as separate runs in one
+    write. Cached frames skip the model; the rest are packed up to
+    BATCH_MAX_IMAGES_PER_CALL per call, and frames missing from a batched
+    reply that did parse are retried on their own. Near-duplicates within
+    the batch (same site and camera, within the frame cache threshold) are
+    analyzed once and share the cards. Frames whose call failed are
+    reported in ``failed`` and not saved.
+    """
+    count = len(frames)
+    results = [None] * count
+    cached = [False] * count
+    keys = [None] * count
+    pending = []
+    for i, frame in enumerate(frames):
+        if not bypass and FRAME_CACHE_ENABLED:
+            keys[i] = FRAME_CACHE.hash(frame['image'], _frame_namespace(frame.get('site'), frame.get('camera')))
+            hit = FRAME_CACHE.lookup(keys[i])
+            _count_cache('frame', hit is not None)
+            if hit is not None:
+                results[i], cached[i] = hit, True
+                continue
+        pending.append(i)
+    pending, duplicates = _group_duplicates(pending, keys)
+    chunks = [pending[j:j + BATCH_MAX_IMAGES_PER_CALL] for j in range(0, len(pending), BATCH_MAX_IMAGES_PER_CALL)]
+    calls = 0
+    errors = {}
+
+    def run_chunk(indexes):
+        # None means the call failed; a list (possibly with None gaps) means it answered
+        if len(indexes) == 1:
+            cards = analyze_image_openai(frames[indexes[0]]['image'], fallback=None)
+            return indexes, None if cards is None else [cards]
+        return indexes, analyze_images_openai([(frames[i]['image'], _frame_label(frames[i])) for i in indexes])
+
+    if chunks:
+        with ThreadPoolExecutor(max_workers=max(1, min(BATCH_CONCURRENCY, len(chunks)))) as pool:
+            missing = []
+            for indexes, cards_list in pool.map(run_chunk, chunks):
+                calls += 1
+                if cards_list is None:
+                    errors.update((i, 'Model call failed') for i in indexes)
+                    continue
+                for i, cards in zip(indexes, cards_list):
+                    results[i] = cards
+                    if cards is None:
+                        missing.append([i])
+            if missing:
+                app.logger.warning("Batch reply missed %d of %d frames; analyzing them individually",
+                                   len(missing), len(pending))
+            for indexes, cards_list in pool.map(run_chunk, missing):
+                calls += 1
+                if cards_list is None:
+                    errors[indexes[0]] = 'Model call failed'
+                else:
+                    results[indexes[0]] = cards_list[0]
+    for i in pending:
+        if keys[i] is not None and results[i] is not None:
+            FRAME_CACHE.store(keys[i], results[i])
+        for d in duplicates.get(i, ()):
+            results[d], cached[d] = results[i], results[i] is not None
+            if i in errors:
+                errors[d] = errors[i]
+    analyzed = [i for i in range(count) if results[i] is not None]
+    items = [
+        {'cards': results[i], 'site': frames[i].get('site') or SITE_ID, 'ts': frames[i].get('ts'),
+         'camera': frames[i].get('camera')}
+        for i in analyzed
+    ]
+    try:
+        with stage('persist'):
+            records = RUN_STORE.append_many(items)
+    except Exception as e:
+        app.logger.error("Failed to save batch analysis data: %s", e)
+        records = [None] * len(items)
+    runs = []
+    for i, item, rec in zip(analyzed, items, records):
+        frame = frames[i]
+        runs.append({
+            'frame': i,
+            'filename': frame.get('filename'),
+            'run_id': rec['id'] if rec else None,
+            'ts': rec['ts'] if rec else frame.get('ts'),
+            'site': item['site'],
+            'camera': frame.get('camera'),
+            'cached': cached[i],
+            'cards': results[i],
+        })
+    failed = [{'frame': i, 'filename': frames[i].get('filename'), 'error': errors.get(i, 'No analysis returned')}
+              for i in range(count) if results[i] is None]
+    if failed:
+        METRICS.inc('batch_failed_frames_total', len(failed))
+    return {'frames': count, 'model_calls': calls, 'cached': sum(cached), 'runs': runs, 'failed': failed}
+
+# Query index over all runs, kept current as new runs are appended
+HISTORY = HistoryIndex()
+HISTORY.build(RUN_STORE)
+RUN_STORE.subscribe(HISTORY.add)
+HISTORY_MAX_LIMIT = int(os.getenv('HISTORY_MAX_LIMIT', 200))
+
+# Voice replies and realtime instructions depend only on the latest run, so
+# cache them per RUN_STORE.version and drop them when a new run is saved
+VOICE_CACHE = VersionedCache(max_entries=int(os.getenv('VOICE_CACHE_SIZE', 256)), version=RUN_STORE.version)
+CONTEXT_CACHE = VersionedCache(max_entries=8, version=RUN_STORE.version)
+RUN_STORE.subscribe(lambda _record: (VOICE_CACHE.invalidate(RUN_STORE.version),
+                                     CONTEXT_CACHE.invalidate(RUN_STORE.version)))
+
+def _build_instructions():
+    # Combine base instructions with latest analysis context
+    context = RUN_STORE.latest_cards([])
+    instr = IMAGE_ANALYSIS_INSTRUCTION
+    if context:
+        try:
+            instr += "\n\nLatest analysis data (JSON array of cards):\n" + json.dumps(context)
+        except Exception:
+            pass
+    return instr
+
+def context_instructions(version):
+    """
+    Base instructions plus the latest run's cards, built once per run version.
+    """
+    instr = CONTEXT_CACHE.get('instructions', version)
+    _count_cache('context', instr is not None)
+    if instr is None:
+        instr = _build_instructions()
+        CONTEXT_CACHE.put('instructions', version, instr)
+    return instr
+
+def session_payload(version, model, voice):
+    """
+    Encoded realtime session request body, built once per run version.
+    """
+    return CONTEXT_CACHE.get_or_create(('session', model, voice), version, lambda: json.dumps({
+        'model': model, 'voice': voice, 'instructions': context_instructions(version),
+    }).encode('utf-8'))
+
+# PDF reports: skeleton parsed once, rendered reports cached per run set
+REPORTS = ReportEngine(os.getenv('SKELETON_PDF', 'SpotCheck Sample report.pdf'),
+                       cache_size=int(os.getenv('REPORT_CACHE_SIZE', 32)))
+REPORT_MAX_RUNS = int(os.getenv('REPORT_MAX_RUNS', 500))
+
+# Bounded worker pool for analysis jobs; beyond workers + backlog requests get 429
+JOBS = JobQueue(
+    workers=int(os.getenv('ANALYSIS_WORKERS', 4)),
+    max_pending=int(os.getenv('ANALYSIS_MAX_PENDING', 16)),
+    timeout=float(os.getenv('ANALYSIS_JOB_TIMEOUT', 90)),
+)
+
+# Optional server-side ingestion of the drone stream (INGEST_SOURCE: FLV/HLS URL, video file or .mjpeg)
+INGEST_SOURCE = os.getenv('INGEST_SOURCE', '').strip()
+INGESTER = None
+if INGEST_SOURCE:
+    INGESTER = StreamIngester(
+        INGEST_SOURCE,
+        ingest_frame,
+        site=os.getenv('INGEST_SITE') or SITE_ID,
+        min_interval=float(os.getenv('INGEST_MIN_INTERVAL', 2)),
+        max_interval=float(os.getenv('INGEST_MAX_INTERVAL', 30)),
+        threshold=float(os.getenv('INGEST_SCENE_THRESHOLD', 0.08)),
+        queue_size=int(os.getenv('INGEST_QUEUE_SIZE', 4)),
+        sample_fps=float(os.getenv('INGEST_SAMPLE_FPS', 2)),
+        ffmpeg=os.getenv('FFMPEG_BIN', 'ffmpeg'),
+    )
+    # Skip the debug reloader's parent process so only one worker pulls the stream
+    if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        INGESTER.start()
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    started = g.pop('request_started', None)
+    endpoint = request.endpoint or 'unknown'
+    if started is not None:
+        METRICS.observe('request_seconds', time.perf_counter() - started, endpoint=endpoint)
+    METRICS.inc('requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    if response.status_code >= 500:
+        METRICS.inc('errors_total', stage='request')
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """
+    Prometheus text-format metrics.
+    """
+    jobs = JOBS.stats()
+    METRICS.set('jobs_in_flight', jobs['in_flight'])
+    METRICS.set('jobs_rejected_total', jobs['rejected'], kind='counter')
+    report = REPORTS.stats()
+    METRICS.set('report_cache_hits_total', report['hits'], kind='counter')
+    METRICS.set('report_cache_misses_total', report['misses'], kind='counter')
+    METRICS.set('frame_cache_entries', FRAME_CACHE.stats()['entries'])
+    METRICS.set('runs_stored', len(RUN_STORE))
+    for name, breaker in BREAKERS.items():
+        METRICS.set('circuit_open', 0 if breaker.state == CircuitBreaker.CLOSED else 1, breaker=name)
+    for name, policy in POLICIES.items():
+        stats = policy.stats()
+        for field in ('retried', 'hedged', 'hedge_wins', 'deadline_exceeded', 'short_circuited'):
+            METRICS.set(f'outbound_{field}_total', stats[field], kind='counter', endpoint=name)
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 def index():
     return send_from_directory('.', 'index.html')
 
 @app.route('/api/analysis', methods=['GET', 'POST'])
 def analysis():
-    # Debug incoming request
-    app.logger.debug("/api/analysis called; method=%s", request.method)
-    app.logger.debug("Headers: %s", dict(request.headers))
-    app.logger.debug("Content-Type: %s", request.content_type)
-    app.logger.debug("Form keys: %s", list(request.form.keys()))
-    app.logger.debug("Files keys: %s", list(request.files.keys()))
     # Accept an image snapshot for analysis
     if request.method == 'POST':
+        try:
+            _check_upload_length()
+        except ImageRejected as e:
+            return _rejected(e)
         if 'snapshot' in request.files:
-            file = request.files['snapshot']
-            img_bytes = file.read()
+            try:
+                img_bytes = _read_snapshot(request.files['snapshot'])
+            except ImageRejected as e:
+                return _rejected(e)
             app.logger.debug(
                 "/api/analysis POST received: snapshot size=%d bytes",
                 len(img_bytes)
             )
-            cards = analyze_image_openai(img_bytes)
-            app.logger.debug(
-                "/api/analysis responding with %d cards: %s",
-                len(cards), cards
-            )
-            # Persist latest analysis to data directory by appending to run list
+            bypass = _request_flag('bypass_cache')
+            site = request.form.get('site')
             try:
-                path = os.path.join(DATA_DIR, 'last_analysis.json')
-                runs = []
-                if os.path.exists(path):
-                    with open(path, 'r') as f:
-                        existing = json.load(f)
-                    # Determine if existing is a single run or list of runs
-                    if isinstance(existing, list):
-                        if existing and isinstance(existing[0], list):
-                            runs = existing
-                        else:
-                            runs = [existing]
-                runs.append(cards)
-                with open(path, 'w') as f:
-                    json.dump(runs, f)
-                app.logger.debug("Appended analysis. Total runs: %d, saved to %s", len(runs), path)
-            except Exception as e:
-                app.logger.error("Failed to save analysis data: %s", e)
+                job = JOBS.submit('analysis', process_snapshot, img_bytes, site=site, bypass=bypass,
+                                  meta={'site': site or SITE_ID})
+            except QueueFull:
+                app.logger.warning("/api/analysis rejected: analysis queue is full")
+                return jsonify({'error': 'Analysis queue is full, retry later'}), 429, {'Retry-After': '5'}
+            # async=1: hand back the job ID and let the client poll or subscribe
+            if _request_flag('async'):
+                return jsonify({'job_id': job.id, 'status': job.status,
+                                'status_url': f"/api/analysis/{job.id}"}), 202
+            JOBS.wait(job)
+            if job.status != 'done':
+                return jsonify({'error': job.error or 'Analysis failed', 'job_id': job.id}), 504 if job.status == 'timeout' else 502
+            cards = job.result
+            if _log_payload():
+                app.logger.debug(
+                    "/api/analysis responding with %d cards: %s",
+                    len(cards), cards
+                )
             return jsonify(cards)
         else:
             app.logger.warning(
@@ -142,87 +766,278 @@ def analysis():
     # Fallback or GET: return stub data
     return jsonify(STUB_DATA)
 
+@app.route('/api/analysis/batch', methods=['POST'])
+def analysis_batch():
+    """
+    Analyze many snapshots at once (``snapshots`` files, e.g. a post-flight
+    upload). Optional ``meta`` is a JSON array aligned with the files, each
+    item with ``ts`` (epoch or ISO), ``site``, ``camera`` and ``roi``; the
+    ``site`` form field is the default site. Each frame becomes its own run.
+    """
+    if request.content_length and request.content_length > BATCH_MAX_BYTES:
+        return _rejected(ImageRejected(f"Batch exceeds {BATCH_MAX_BYTES} bytes", status=413))
+    files = request.files.getlist('snapshots') or request.files.getlist('snapshot')
+    if not files:
+        return jsonify({'error': "Missing 'snapshots' files"}), 400
+    if len(files) > BATCH_MAX_FRAMES:
+        return jsonify({'error': f"At most {BATCH_MAX_FRAMES} frames per batch"}), 413
+    try:
+        meta = json.loads(request.form.get('meta') or '[]')
+        if not isinstance(meta, list):
+            raise ValueError('meta must be a JSON array')
+    except ValueError as e:
+        return jsonify({'error': f"Invalid meta: {e}"}), 400
+    default_site = request.form.get('site')
+    frames, rejected = [], []
+    for i, file in enumerate(files):
+        info = meta[i] if i < len(meta) and isinstance(meta[i], dict) else {}
+        try:
+            ts, roi, site, camera = _batch_frame_meta(info, default_site)
+            image = _read_snapshot(file, roi=roi)
+        except ValueError as e:
+            # ImageRejected is a ValueError too; skip the frame, keep the batch
+            rejected.append({'frame': i, 'filename': file.filename, 'error': str(e)})
+            continue
+        frames.append({'image': image, 'filename': file.filename, 'ts': ts, 'site': site, 'camera': camera})
+    if not frames:
+        return jsonify({'error': 'No valid frames', 'rejected': rejected}), 400
+    try:
+        job = JOBS.submit('analysis-batch', process_batch, frames, bypass=_request_flag('bypass_cache'),
+                          timeout=BATCH_JOB_TIMEOUT, meta={'frames': len(frames), 'rejected': rejected})
+    except QueueFull:
+        app.logger.warning("/api/analysis/batch rejected: analysis queue is full")
+        return jsonify({'error': 'Analysis queue is full, retry later'}), 429, {'Retry-After': '5'}
+    if _request_flag('async'):
+        return jsonify({'job_id': job.id, 'status': job.status, 'frames': len(frames), 'rejected': rejected,
+                        'status_url': f"/api/analysis/{job.id}"}), 202
+    JOBS.wait(job)
+    if job.status != 'done':
+        return jsonify({'error': job.error or 'Batch analysis failed', 'job_id': job.id}), 504 if job.status == 'timeout' else 502
+    result = dict(job.result, rejected=rejected)
+    if result['failed'] and not result['runs']:
+        # Nothing was analyzed, so nothing was saved: report it as an upstream failure
+        return jsonify(dict(result, error='Batch analysis failed')), 502
+    return jsonify(result)
+
+@app.route('/api/analysis/stream', methods=['POST'])
+def analysis_stream():
+    """
+    Analyze a snapshot and stream cards back as Server-Sent Events: one
+    ``card`` event per card as soon as it is parsed, then ``done`` with the
+    persisted run ID (or ``error``).
+    """
+    try:
+        _check_upload_length()
+    except ImageRejected as e:
+        return _rejected(e)
+    if 'snapshot' not in request.files:
+        return jsonify({'error': "Missing 'snapshot' file"}), 400
+    try:
+        img_bytes = _read_snapshot(request.files['snapshot'])
+    except ImageRejected as e:
+        return _rejected(e)
+    site = request.form.get('site')
+    bypass = _request_flag('bypass_cache')
+    sink = queue.Queue()
+    try:
+        job = JOBS.submit('analysis-stream', stream_snapshot, img_bytes, sink, site=site, bypass=bypass,
+                          meta={'site': site or SITE_ID})
+    except QueueFull:
+        app.logger.warning("/api/analysis/stream rejected: analysis queue is full")
+        return jsonify({'error': 'Analysis queue is full, retry later'}), 429, {'Retry-After': '5'}
+
+    def stream():
+        yield f"event: job\ndata: {json.dumps({'job_id': job.id})}\n\n"
+        while True:
+            try:
+                kind, data = sink.get(timeout=15)
+            except queue.Empty:
+                # get() applies the job deadline
+                JOBS.get(job.id)
+                if job.done.is_set():
+                    yield f"event: error\ndata: {json.dumps({'error': job.error or 'Analysis ended without result'})}\n\n"
+                    return
+                yield ": ping\n\n"
+                continue
+            yield f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+            if kind in ('done', 'error'):
+                return
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/analysis/<job_id>')
+def analysis_job(job_id):
+    """
+    Poll an asynchronous analysis job.
+    """
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/analysis/events')
+def analysis_events():
+    """
+    Server-Sent Events stream of analysis job completions.
+    """
+    subscriber = JOBS.subscribe()
+
+    def stream():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = subscriber.get(timeout=15)
+                except queue.Empty:
+                    # Keep-alive comment so proxies don't close the stream
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: job\ndata: {json.dumps(event)}\n\n"
+        finally:
+            JOBS.unsubscribe(subscriber)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs')
+def jobs_status():
+    """
+    Report worker pool utilisation and job counters.
+    """
+    return jsonify(JOBS.stats())
+
+@app.route('/api/frame-cache', methods=['GET', 'DELETE'])
+def frame_cache():
+    """
+    Report frame cache hit/miss statistics; DELETE clears the cache.
+    """
+    if request.method == 'DELETE':
+        FRAME_CACHE.clear()
+    stats = FRAME_CACHE.stats()
+    stats['enabled'] = stats['enabled'] and FRAME_CACHE_ENABLED
+    return jsonify(stats)
+
+@app.route('/api/ingest')
+def ingest_status():
+    """
+    Report the state of the server-side stream ingestion worker.
+    """
+    if INGESTER is None:
+        return jsonify({'running': False, 'source': None})
+    return jsonify(INGESTER.stats())
+
+@app.route('/api/resilience', methods=['GET', 'DELETE'])
+def resilience():
+    """
+    Report circuit breaker state and per-endpoint call policy counters;
+    DELETE closes all breakers.
+    """
+    if request.method == 'DELETE':
+        for breaker in BREAKERS.values():
+            breaker.reset()
+    return jsonify({
+        'breakers': {name: breaker.stats() for name, breaker in BREAKERS.items()},
+        'policies': {name: policy.stats() for name, policy in POLICIES.items()},
+    })
+
+@app.route('/api/response-cache', methods=['GET', 'DELETE'])
+def response_cache():
+    """
+    Report voice reply and context cache statistics; DELETE clears both.
+    """
+    if request.method == 'DELETE':
+        VOICE_CACHE.clear()
+        CONTEXT_CACHE.clear()
+    return jsonify({'voice': VOICE_CACHE.stats(), 'context': CONTEXT_CACHE.stats()})
+
+@app.route('/api/history')
+def history():
+    """
+    Page through past runs, newest first. Filters: ``q`` (all words must
+    appear in a card title or description), ``since``/``until`` (epoch
+    seconds or ISO dates) and ``site``. Pass ``next_cursor`` from the
+    response as ``cursor`` to fetch the next page.
+    """
+    try:
+        since = parse_time(request.args.get('since'))
+        until = parse_time(request.args.get('until'))
+        cursor = request.args.get('cursor', type=int)
+    except ValueError:
+        return jsonify({'error': 'Invalid since/until'}), 400
+    limit = max(1, min(request.args.get('limit', 50, type=int), HISTORY_MAX_LIMIT))
+    with stage('history_query'):
+        run_ids, next_cursor = HISTORY.search(query=request.args.get('q'), since=since, until=until,
+                                              site=request.args.get('site'), cursor=cursor, limit=limit)
+    runs = [run for run in (RUN_STORE.get(run_id) for run_id in run_ids) if run is not None]
+    return jsonify({'runs': runs, 'next_cursor': next_cursor, 'total_runs': len(HISTORY)})
+
+@app.route('/api/history/trends')
+def history_trends():
+    """
+    Trend series for cards whose title contains ``title`` (e.g. Progress,
+    Safety, Budget): counts per ``bucket`` seconds (default one day) and the
+    most recent ``limit`` points; ``descriptions=1`` includes card text.
+    Without ``title``, lists the known card titles.
+    """
+    title = request.args.get('title')
+    if not title:
+        return jsonify({'titles': HISTORY.titles()})
+    try:
+        since = parse_time(request.args.get('since'))
+        until = parse_time(request.args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'Invalid since/until'}), 400
+    bucket = max(60, request.args.get('bucket', 86400, type=int))
+    limit = max(0, min(request.args.get('limit', 100, type=int), HISTORY_MAX_LIMIT))
+    with stage('history_query'):
+        series = HISTORY.trend(title, since=since, until=until, bucket=bucket, limit=limit)
+    if _request_flag('descriptions'):
+        for point in series['points']:
+            run = RUN_STORE.get(point['run_id']) or {}
+            point['description'] = next((c.get('description') for c in run.get('cards') or []
+                                         if isinstance(c, dict) and c.get('title') == point['title']), None)
+    series['titles'] = [t['title'] for t in HISTORY.titles(title)]
+    return jsonify(series)
+
 @app.route('/api/export-pdf')
 def export_pdf():
     """
     Export a PDF report by using the SpotCheck Sample report.pdf as a skeleton,
-    then appending a page with the latest analysis cards.
+    followed by pages with the analysis cards. Defaults to the latest run;
+    ``last=N`` or ``since``/``until`` (epoch seconds or ISO dates) and
+    ``site`` select several runs.
     """
-    # Load latest analysis cards
-    cards = STUB_DATA
-    path = os.path.join(DATA_DIR, 'last_analysis.json')
     try:
-        with open(path, 'r') as f:
-            data = json.load(f)
-        if isinstance(data, list):
-            if data and isinstance(data[0], list):
-                cards = data[-1]
-            elif data and isinstance(data[0], dict):
-                cards = data
-    except Exception:
-        cards = STUB_DATA
-    # Path to skeleton PDF
-    skeleton = os.getenv('SKELETON_PDF', 'SpotCheck Sample report.pdf')
+        since = parse_time(request.args.get('since'))
+        until = parse_time(request.args.get('until'))
+        last = request.args.get('last', type=int)
+    except ValueError:
+        return jsonify({'error': 'Invalid since/until'}), 400
+    site = request.args.get('site')
+    if last is None and since is None and until is None and site is None:
+        # Default export: the latest run is already in memory
+        latest = RUN_STORE.latest()
+        runs = [latest] if latest is not None else []
+        key = tuple(r['id'] for r in runs)
+    else:
+        last = REPORT_MAX_RUNS if last is None else min(last, REPORT_MAX_RUNS)
+        entries = RUN_STORE.select(since=since, until=until, site=site, last=last)
+        runs = [RUN_STORE.read_entry(e) for e in entries]
+        key = tuple(e[0] for e in entries)
+    if not runs:
+        runs = [{'cards': STUB_DATA}]
+        key = ('stub',)
     try:
-        if os.path.exists(skeleton):
-            reader = PdfReader(skeleton)
-            writer = PdfWriter()
-            # Copy skeleton pages
-            for pg in reader.pages:
-                writer.add_page(pg)
-            # Create analysis page
-            analysis_buf = io.BytesIO()
-            width, height = 595, 842
-            p = canvas.Canvas(analysis_buf, pagesize=(width, height))
-            y = height - 40
-            p.setFont("Helvetica-Bold", 16)
-            p.drawString(40, y, "Analysis Summary")
-            y -= 30
-            p.setFont("Helvetica", 12)
-            for item in cards:
-                p.setFont("Helvetica-Bold", 14)
-                p.drawString(40, y, item.get('title', ''))
-                y -= 20
-                p.setFont("Helvetica", 12)
-                text = item.get('description', '')
-                p.drawString(60, y, text)
-                y -= 30
-                if y < 60:
-                    p.showPage()
-                    y = height - 40
-            p.showPage()
-            p.save()
-            analysis_buf.seek(0)
-            # Append analysis page to writer
-            a_reader = PdfReader(analysis_buf)
-            writer.add_page(a_reader.pages[0])
-            # Output combined PDF
-            out_buf = io.BytesIO()
-            writer.write(out_buf)
-            out_buf.seek(0)
-            return send_file(out_buf, as_attachment=True, download_name='report.pdf', mimetype='application/pdf')
+        with stage('pdf_render'):
+            data = REPORTS.build(runs, key=key)
     except Exception as e:
-        app.logger.error("Error merging skeleton PDF: %s", e, exc_info=True)
-    # Fallback: simple one-page PDF
-    buf = io.BytesIO()
-    p = canvas.Canvas(buf)
-    width, height = 595, 842
-    y = height - 40
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(40, y, "Construction Progress Report")
-    y -= 40
-    p.setFont("Helvetica", 12)
-    for item in cards:
-        text = f"{item.get('title', '')}: {item.get('description', '')}"
-        p.drawString(40, y, text)
-        y -= 20
-        if y < 40:
-            p.showPage()
-            y = height - 40
-    p.showPage()
-    p.save()
-    buf.seek(0)
-    return send_file(buf, as_attachment=True, download_name='report.pdf', mimetype='application/pdf')
+        app.logger.error("Error building PDF report: %s", e, exc_info=True)
+        return jsonify({'error': 'Failed to build report'}), 500
+    return Response(iter_chunks(data), mimetype='application/pdf', headers={
+        'Content-Disposition': 'attachment; filename=report.pdf',
+        'Content-Length': str(len(data)),
+    })
 
 @app.route('/api/call', methods=['POST'])
 def call():
@@ -242,33 +1057,32 @@ def voice():
     user_input = data.get('input', '').strip()
     if not user_input:
         return jsonify({'error': 'No input provided'}), 400
-    # Load last analysis run as context
-    path = os.path.join(DATA_DIR, 'last_analysis.json')
-    context = []
-    try:
-        if os.path.exists(path):
-            raw = json.load(open(path, 'r'))
-            # pick last run if list of runs
-            if isinstance(raw, list):
-                if raw and isinstance(raw[0], list):
-                    context = raw[-1]
-                elif raw and isinstance(raw[0], dict):
-                    context = raw
-    except Exception:
-        context = []
-    # Prepare messages using external instructions
-    client = OpenAI()
+    # Same question against the same latest run gets the same answer
+    version = RUN_STORE.version
+    key = normalize_question(user_input)
+    reply = VOICE_CACHE.get(key, version)
+    _count_cache('voice', reply is not None)
+    if reply is not None:
+        return jsonify({'reply': reply, 'cached': True})
+    client = get_openai_client()
     messages = [
-        {'role': 'system', 'content': IMAGE_ANALYSIS_INSTRUCTION},
+        {'role': 'system', 'content': context_instructions(version)},
         {'role': 'user', 'content': user_input}
     ]
     try:
-        completion = client.chat.completions.create(
-            model=os.getenv('OPENAI_MODEL', 'gpt-4o'),
-            messages=messages
-        )
+        with stage('voice_model_call'):
+            completion = POLICIES['voice'].call(lambda timeout: client.chat.completions.create(
+                model=os.getenv('OPENAI_MODEL', 'gpt-4o'),
+                messages=messages,
+                timeout=timeout,
+            ))
         reply = completion.choices[0].message.content
+        if reply:
+            VOICE_CACHE.put(key, version, reply)
         return jsonify({'reply': reply})
+    except (CircuitOpen, DeadlineExceeded) as e:
+        app.logger.warning("Voice completion unavailable: %s", e)
+        return _unavailable(e)
     except Exception as e:
         app.logger.error("Voice completion error: %s", e, exc_info=True)
         return jsonify({'error': 'AI completion failed'}), 502
@@ -285,39 +1099,24 @@ def session():
     voice = os.getenv('VOICE')
     if not model or not voice:
         return jsonify({"error": "Server misconfiguration: MODEL or VOICE not set"}), 500
-    url = 'https://api.openai.com/v1/realtime/sessions'
+    url = REALTIME_SESSIONS_URL
     headers = {
         'Authorization': f'Bearer {api_key}',
         'Content-Type': 'application/json'
     }
-    payload = { 'model': model, 'voice': voice }
-    # Build dynamic instructions from latest analysis and examples
-    context = []
-    try:
-        ctx_path = os.path.join(DATA_DIR, 'last_analysis.json')
-        if os.path.exists(ctx_path):
-            raw = json.load(open(ctx_path, 'r'))
-            if isinstance(raw, list):
-                # list of runs
-                if raw and isinstance(raw[0], list):
-                    context = raw[-1]
-                # single run
-                elif raw and isinstance(raw[0], dict):
-                    context = raw
-    except Exception:
-        context = []
-    # Combine base instructions with latest analysis context for realtime sessions
-    instr = IMAGE_ANALYSIS_INSTRUCTION
-    if context:
-        try:
-            instr += "\n\nLatest analysis data (JSON array of cards):\n" + json.dumps(context)
-        except Exception:
-            pass
-    payload['instructions'] = instr
-    try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=10)
+    # Base instructions plus latest analysis context, encoded once per run version
+    body = session_payload(RUN_STORE.version, model, voice)
+    def mint(timeout):
+        resp = HTTP_SESSION.post(url, headers=headers, data=body, timeout=timeout)
         resp.raise_for_status()
+        return resp
+    try:
+        with stage('session_mint'):
+            resp = POLICIES['session'].call(mint)
         return jsonify(resp.json())
+    except (CircuitOpen, DeadlineExceeded) as e:
+        app.logger.warning("Realtime session unavailable: %s", e)
+        return _unavailable(e)
     except Exception as e:
         app.logger.error("Failed to create realtime session: %s", e, exc_info=True)
         return jsonify({"error": "Failed to create realtime session"}), 502
@@ -0,0 +1,128 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from cache hits up to slow model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for k, v in pairs)
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metrics:
+    """
+    Minimal in-process registry of counters and histograms rendered in the
+    Prometheus text exposition format. Metrics are created on first use;
+    ``describe`` attaches HELP text.
+    """
+
+    def __init__(self, prefix='', buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}    # name -> {label_key: value}
+        self._histograms = {}  # name -> {label_key: [bucket counts..., sum, count]}
+        self._values = {}      # name -> (type, {label_key: value}) set at scrape time
+
+    def _name(self, name):
+        return f"{self.prefix}_{name}" if self.prefix else name
+
+    def describe(self, name, help_text):
+        self._help[self._name(name)] = help_text
+
+    def inc(self, name, value=1, **labels):
+        full = self._name(name)
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(full, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, kind='gauge', **labels):
+        """
+        Set a value copied from a component's own stats (``kind`` is the
+        Prometheus type to report, e.g. gauge or counter).
+        """
+        full = self._name(name)
+        with self._lock:
+            _, series = self._values.setdefault(full, (kind, {}))
+            series[_label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        full = self._name(name)
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(full, {})
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [0] * (len(self.buckets) + 2)
+            # Store per-bucket counts; they are made cumulative on render
+            if idx < len(self.buckets):
+                state[idx] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def timer(self, name, errors=None, **labels):
+        """
+        Time the enclosed block into histogram ``name``; exceptions are also
+        counted in counter ``errors`` (default ``<name>_errors_total``).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(errors or f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+            for name in sorted(self._values):
+                kind, series = self._values[name]
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, state in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, state):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {state[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(state[-2])}")
+                    lines.append(f"{name}_count{_format_labels(key)} {state[-1]}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,181 @@
+import io
+import os
+import math
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.utils import simpleSplit
+from PyPDF2 import PdfReader, PdfWriter
+
+logger = logging.getLogger(__name__)
+
+# Bump when the page layout changes so cached reports are not reused
+LAYOUT_VERSION = 1
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 40
+BOTTOM = 50
+
+
+def render_cards_pdf(sections, title="Analysis Summary"):
+    """
+    Render ``sections`` (a list of ``(heading, cards)``) to PDF bytes, word
+    wrapping descriptions and breaking onto as many pages as needed.
+    """
+    buf = io.BytesIO()
+    p = canvas.Canvas(buf, pagesize=(PAGE_WIDTH, PAGE_HEIGHT))
+    text_width = PAGE_WIDTH - 2 * MARGIN
+    y = PAGE_HEIGHT - MARGIN
+
+    def ensure(space):
+        nonlocal y
+        if y - space < BOTTOM:
+            p.showPage()
+            y = PAGE_HEIGHT - MARGIN
+
+    def lines(text, font, size, indent, leading):
+        nonlocal y
+        p.setFont(font, size)
+        for line in simpleSplit(str(text), font, size, text_width - indent) or ['']:
+            ensure(leading)
+            p.setFont(font, size)
+            p.drawString(MARGIN + indent, y, line)
+            y -= leading
+
+    lines(title, "Helvetica-Bold", 16, 0, 30)
+    for heading, cards in sections:
+        if heading:
+            ensure(60)
+            lines(heading, "Helvetica-Bold", 13, 0, 22)
+        for item in cards:
+            if not isinstance(item, dict):
+                continue
+            # Keep a title together with at least the first description line
+            ensure(40)
+            lines(item.get('title', ''), "Helvetica-Bold", 12, 0, 16)
+            lines(item.get('description', ''), "Helvetica", 10, 20, 13)
+            y -= 10
+        y -= 8
+    p.showPage()
+    p.save()
+    return buf.getvalue()
+
+
+class ReportEngine:
+    """
+    Builds PDF reports: skeleton pages (parsed once and reused) followed by
+    the rendered analysis pages. Finished reports are kept in an LRU cache
+    keyed by the run IDs, skeleton version and layout version.
+    """
+
+    def __init__(self, skeleton_path, cache_size=32):
+        self.skeleton_path = skeleton_path
+        self.cache_size = cache_size
+        self._skeleton = None
+        self._skeleton_mtime = None
+        self._cache = OrderedDict()
+        # _lock guards the cache only; the shared skeleton reader is not thread-safe
+        self._lock = threading.Lock()
+        self._skeleton_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _skeleton_version(self):
+        try:
+            return os.path.getmtime(self.skeleton_path)
+        except OSError:
+            return None
+
+    def _load_skeleton(self):
+        """
+        Return the parsed skeleton reader, reloading only if the file changed.
+        """
+        try:
+            mtime = os.path.getmtime(self.skeleton_path)
+        except OSError:
+            self._skeleton, self._skeleton_mtime = None, None
+            return None
+        if self._skeleton is None or mtime != self._skeleton_mtime:
+            with open(self.skeleton_path, 'rb') as f:
+                self._skeleton = PdfReader(io.BytesIO(f.read()))
+            self._skeleton_mtime = mtime
+            logger.info("Loaded report skeleton %s (%d pages)", self.skeleton_path, len(self._skeleton.pages))
+        return self._skeleton
+
+    def build(self, runs, key=None):
+        """
+        Return PDF bytes for ``runs`` (records with ``ts``/``site``/``cards``).
+        ``key`` identifies the run set for caching; None disables caching.
+        """
+        # A stat, not the skeleton lock, so cache hits never wait on a render
+        skeleton_version = self._skeleton_version()
+        cache_key = None
+        if key is not None:
+            cache_key = (key, skeleton_version, LAYOUT_VERSION)
+            with self._lock:
+                cached = self._cache.get(cache_key)
+                if cached is not None:
+                    self._cache.move_to_end(cache_key)
+                    self.hits += 1
+                    return cached
+                self.misses += 1
+        # Render outside the cache lock so hits never wait behind a large report
+        multi = len(runs) > 1
+        sections = [(self._heading(run) if multi else None, run.get('cards') or []) for run in runs]
+        title = "Analysis Summary" if skeleton_version is not None else "Construction Progress Report"
+        analysis_pdf = render_cards_pdf(sections, title=title)
+        writer = PdfWriter()
+        out = io.BytesIO()
+        with self._skeleton_lock:
+            skeleton = self._load_skeleton()
+            if skeleton is not None:
+                for pg in skeleton.pages:
+                    writer.add_page(pg)
+            for pg in PdfReader(io.BytesIO(analysis_pdf)).pages:
+                writer.add_page(pg)
+            # Skeleton objects are resolved lazily from the shared reader while writing
+            writer.write(out)
+        data = out.getvalue()
+        if cache_key is not None:
+            with self._lock:
+                self._cache[cache_key] = data
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._cache), 'hits': self.hits, 'misses': self.misses}
+
+    @staticmethod
+    def _heading(run):
+        ts = run.get('ts')
+        when = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts else 'Unknown time'
+        site = run.get('site')
+        return f"Run {when}" + (f" - {site}" if site else "")
+
+
+def parse_time(value):
+    """
+    Parse an epoch-seconds number or an ISO 8601 date/datetime to epoch
+    seconds. Returns None for empty input; raises ValueError otherwise.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"Invalid time value: {value!r}")
+    try:
+        ts = float(value)
+    except ValueError:
+        ts = datetime.fromisoformat(value).timestamp()
+    if not math.isfinite(ts):
+        raise ValueError(f"Invalid time value: {value!r}")
+    return ts
+
+
+def iter_chunks(data, chunk_size=64 * 1024):
+    for i in range(0, len(data), chunk_size):
+        yield data[i:i + chunk_size]
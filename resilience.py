@@ -0,0 +1,314 @@
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of calling a provider whose circuit breaker is open.
+    ``retry_after`` is the number of seconds until the next probe is allowed.
+    """
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit '{name}' is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a call (including retries and hedges) runs past its deadline.
+    """
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker for one upstream provider.
+
+    Outcomes of the last ``window`` calls are kept. Once at least
+    ``min_calls`` are recorded and the failure rate reaches
+    ``failure_threshold`` the circuit opens and calls fail fast for
+    ``cooldown`` seconds. After that a single probe is let through
+    (half-open); its success closes the circuit, its failure reopens it.
+    Outcomes of calls that started before the circuit opened are ignored
+    until it closes again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name, window=20, min_calls=5, failure_threshold=0.5, cooldown=30.0):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._probe_started = None
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def allow(self):
+        """
+        Let a call proceed, or raise CircuitOpen. Returns True when the call
+        is the half-open probe; pass that back as ``record(..., probe=True)``.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if state == self.CLOSED:
+                return False
+            # A probe that never reported back (killed worker) must not wedge the circuit
+            if state == self.HALF_OPEN and (self._probe_started is None or now - self._probe_started > self.cooldown):
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            retry_after = max(0.0, self._opened_at + self.cooldown - now) if state == self.OPEN else 1.0
+        raise CircuitOpen(self.name, retry_after)
+
+    def record(self, success, probe=False):
+        with self._lock:
+            if probe:
+                self._probe_started = None
+                if self._current_state(time.monotonic()) != self.HALF_OPEN:
+                    return
+                if success:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                    logger.info("Circuit %s closed", self.name)
+                else:
+                    self._trip()
+                return
+            if self._state != self.CLOSED:
+                # Straggler from before the circuit opened; only the probe decides
+                return
+            self._outcomes.append(bool(success))
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_threshold * len(self._outcomes):
+                self._trip()
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._outcomes.clear()
+            self._probe_started = None
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            failures = self._outcomes.count(False)
+            return {
+                'state': state,
+                'failure_rate': (failures / len(self._outcomes)) if self._outcomes else 0.0,
+                'recent_calls': len(self._outcomes),
+                'opened': self.opened,
+                'rejected': self.rejected,
+                'retry_after': max(0.0, self._opened_at + self.cooldown - now) if state == self.OPEN else 0.0,
+                'failure_threshold': self.failure_threshold,
+                'min_calls': self.min_calls,
+                'cooldown': self.cooldown,
+            }
+
+    def _current_state(self, now):
+        if self._state == self.OPEN and now - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def _trip(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+        logger.warning("Circuit %s opened", self.name)
+
+
+class CallPolicy:
+    """
+    Deadline, retries and hedging for one kind of outbound call.
+
+    ``call(fn)`` invokes ``fn(timeout)`` where ``timeout`` is the time left
+    before ``deadline``; ``fn`` must pass it on to its client so no attempt
+    outlives the deadline. Failures for which ``retryable(exc)`` is true
+    are retried up to ``retries`` times with jittered exponential backoff
+    and count against the breaker; other errors are raised at once. A
+    failure that ``is_timeout(exc)`` or that lands past the deadline is
+    raised as DeadlineExceeded. With ``hedge_after`` set, a second identical
+    attempt is started on ``hedge_pool`` if the first has not answered by
+    then and the pool has a free thread; the faster one wins.
+    """
+
+    def __init__(self, name, breaker, deadline=30.0, retries=1, backoff=0.25, max_backoff=2.0,
+                 hedge_after=None, retryable=None, is_timeout=None, hedge_pool=None):
+        self.name = name
+        self.breaker = breaker
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after or None
+        self.retryable = retryable or (lambda e: True)
+        self.is_timeout = is_timeout or (lambda e: isinstance(e, TimeoutError))
+        self.hedge_pool = hedge_pool
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+        self.short_circuited = 0
+
+    def call(self, fn, deadline=None):
+        end = time.monotonic() + (deadline or self.deadline)
+        self._count('calls')
+        attempt = 0
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                self._count('deadline_exceeded')
+                raise DeadlineExceeded(f"{self.name}: deadline of {deadline or self.deadline}s exceeded")
+            try:
+                probe = self.breaker.allow()
+            except CircuitOpen:
+                self._count('short_circuited')
+                raise
+            try:
+                if self.hedge_after and self.hedge_pool is not None and remaining > self.hedge_after:
+                    result = self._hedged(fn, end)
+                else:
+                    result = fn(remaining)
+            except Exception as e:
+                timed_out = isinstance(e, DeadlineExceeded) or self.is_timeout(e) or time.monotonic() >= end
+                retryable = timed_out or self.retryable(e)
+                # Client errors (bad request, auth) say nothing about provider health
+                self.breaker.record(not retryable, probe=probe)
+                if not retryable:
+                    raise
+                self._count('failures')
+                if timed_out and (attempt >= self.retries or time.monotonic() >= end):
+                    self._count('deadline_exceeded')
+                    if isinstance(e, DeadlineExceeded):
+                        raise
+                    raise DeadlineExceeded(f"{self.name}: deadline of {deadline or self.deadline}s exceeded") from e
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                self._count('retried')
+                delay = min(self.max_backoff, self.backoff * (2 ** (attempt - 1))) * random.uniform(0.5, 1.0)
+                if time.monotonic() + delay >= end:
+                    self._count('deadline_exceeded')
+                    raise DeadlineExceeded(f"{self.name}: no time left to retry after {e}") from e
+                logger.info("%s attempt %d failed (%s); retrying in %.2fs", self.name, attempt, e, delay)
+                time.sleep(delay)
+                continue
+            self.breaker.record(True, probe=probe)
+            return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'breaker': self.breaker.name,
+                'deadline': self.deadline,
+                'retries': self.retries,
+                'hedge_after': self.hedge_after,
+                'calls': self.calls,
+                'failures': self.failures,
+                'retried': self.retried,
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+                'deadline_exceeded': self.deadline_exceeded,
+                'short_circuited': self.short_circuited,
+            }
+
+    def _count(self, field, n=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def _hedged(self, fn, end):
+        """
+        Run ``fn`` and, if it is still running after ``hedge_after``, a second
+        copy on the hedge pool; return the first success. The loser is left
+        to finish on its own (bounded by the timeout it was given).
+        """
+        primary = _start(fn, end - time.monotonic(), name=f'{self.name}-call')
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        pending = {primary}
+        remaining = end - time.monotonic()
+        hedge = self.hedge_pool.try_submit(fn, remaining) if remaining > 0 else None
+        if hedge is not None:
+            self._count('hedged')
+            pending.add(hedge)
+        error = None
+        while pending:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        raise DeadlineExceeded(f"{self.name}: deadline exceeded")
+
+
+def _start(fn, timeout, name):
+    """
+    Run ``fn(timeout)`` on a thread of its own and return its Future. The
+    first attempt of a hedged call never waits for a pool slot, so the hedge
+    timer only measures time actually spent upstream.
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(timeout))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+
+class HedgePool:
+    """
+    Bounded thread pool for hedge attempts. ``try_submit`` never queues:
+    when every thread is busy it returns None and the call is not hedged,
+    so hedging cannot add load while the process is already saturated.
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+        self._slots = threading.Semaphore(max_workers)
+
+    def try_submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _future: self._slots.release())
+        return future
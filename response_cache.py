@@ -0,0 +1,88 @@
+import re
+import threading
+from collections import OrderedDict
+
+_SPACE_RE = re.compile(r"\s+")
+_TRAILING_RE = re.compile(r"[\s?!.,;:]+$")
+
+
+def normalize_question(text):
+    """
+    Canonical form of a user question for cache keys: lowercase, single
+    spaces, no trailing punctuation.
+    """
+    return _TRAILING_RE.sub('', _SPACE_RE.sub(' ', str(text).strip().lower()))
+
+
+class VersionedCache:
+    """
+    LRU cache whose entries belong to one context version.
+
+    Callers pass the version their value was computed against (here the
+    RunStore version). ``invalidate`` moves the cache to a new version and
+    drops everything older; values computed against an old version are
+    neither returned nor stored, so a reply raced by a new run never leaks
+    into the new context.
+    """
+
+    def __init__(self, max_entries=256, version=None):
+        self.max_entries = max_entries
+        self._version = version
+        self._entries = OrderedDict()  # key -> value
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self._version or key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key, version, value):
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_create(self, key, version, factory):
+        """
+        Return the cached value, or build it with ``factory()`` and store it.
+        """
+        value = self.get(key, version)
+        if value is None:
+            value = factory()
+            self.put(key, version, value)
+        return value
+
+    def invalidate(self, version):
+        with self._lock:
+            if version == self._version or (self._version is not None and version < self._version):
+                return
+            self._version = version
+            self._entries.clear()
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'version': self._version,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total) if total else 0.0,
+                'invalidations': self.invalidations,
+                'max_entries': self.max_entries,
+            }
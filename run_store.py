@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def _insert(keys, key):
+    # Runs nearly always arrive in time order; only back-dated ones pay for insort
+    if not keys or keys[-1] <= key:
+        keys.append(key)
+    else:
+        bisect.insort(keys, key)
+
+
+class RunStore:
+    """
+    Append-only store for analysis runs.
+
+    Runs are written as one JSON object per line into size-capped segment
+    files under ``<data_dir>/runs``. Each record carries an ``id``, a ``ts``
+    (epoch seconds), optional ``site``/``camera`` tags and the ``cards`` list. The
+    segments are scanned once at startup to build a small offset index;
+    afterwards appends and ``latest()`` never re-read history.
+    """
+
+    SEGMENT_PREFIX = 'segment-'
+    SEGMENT_SUFFIX = '.jsonl'
+
+    def __init__(self, data_dir, legacy_file='last_analysis.json', segment_max_bytes=64 * 1024 * 1024):
+        self.data_dir = data_dir
+        self.runs_dir = os.path.join(data_dir, 'runs')
+        self.legacy_path = os.path.join(data_dir, legacy_file) if legacy_file else None
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.Lock()
+        # Lightweight per-run index: (id, ts, site, segment path, byte offset)
+        self._index = []
+        self._by_id = {}
+        # (ts, position in _index) keys kept sorted, overall and per site, for range selects
+        self._by_time = []
+        self._sites = {}
+        self._latest = None
+        self._listeners = []
+        os.makedirs(self.runs_dir, exist_ok=True)
+        if not self._segments() and self.legacy_path and os.path.exists(self.legacy_path):
+            self._migrate_legacy()
+        self._load()
+
+    # -- public API ---------------------------------------------------------
+
+    def append(self, cards, site=None, ts=None):
+        """
+        Persist one run and return its record.
+        """
+        return self.append_many([{'cards': cards, 'site': site, 'ts': ts}])[0]
+
+    def append_many(self, items):
+        """
+        Persist several runs with a single write; ``items`` are dicts with
+        ``cards`` and optional ``site``/``ts``/``camera``. Returns the stored
+        records.
+        """
+        records = [
+            self._make_record(it.get('cards') or [], it.get('site'), it.get('ts'), it.get('camera'))
+            for it in items
+        ]
+        if not records:
+            return []
+        lines = [json.dumps(r, separators=(',', ':')) + '\n' for r in records]
+        with self._lock:
+            path = self._active_segment()
+            with open(path, 'ab') as f:
+                offset = f.tell()
+                payload = b''
+                entries = []
+                for rec, line in zip(records, lines):
+                    data = line.encode('utf-8')
+                    entries.append((rec, path, offset + len(payload)))
+                    payload += data
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            for rec, seg, off in entries:
+                self._add_to_index(rec, seg, off)
+            self._latest = records[-1]
+        for rec in records:
+            self._notify(rec)
+        return records
+
+    def latest(self):
+        """
+        Return the most recent run record, or None when the store is empty.
+        """
+        return self._latest
+
+    def latest_cards(self, default=None):
+        """
+        Return the cards of the most recent run, or ``default``.
+        """
+        rec = self._latest
+        if rec is None:
+            return default
+        return rec.get('cards', default)
+
+    @property
+    def version(self):
+        """
+        Monotonic version that changes whenever a run is appended.
+        """
+        return len(self._index)
+
+    def get(self, run_id):
+        """
+        Return the full record for ``run_id``, or None.
+        """
+        entry = self._by_id.get(run_id)
+        if entry is None:
+            return None
+        return self._read(entry)
+
+    def entries(self):
+        """
+        Snapshot of the index entries ``(id, ts, site, segment, offset)`` in
+        insertion order.
+        """
+        with self._lock:
+            return list(self._index)
+
+    def select(self, since=None, until=None, site=None, last=None):
+        """
+        Index entries with ``since <= ts <= until`` (epoch seconds) and a
+        matching site, oldest first; ``last`` keeps only the newest N. The
+        range is found by bisecting time-sorted keys, so the cost depends on
+        the number of entries returned, not on the size of the store.
+        """
+        with self._lock:
+            keys = self._by_time if site is None else self._sites.get(site, [])
+            start = 0 if since is None else bisect.bisect_left(keys, (since, -1))
+            end = len(keys) if until is None else bisect.bisect_right(keys, (until, float('inf')))
+            if last is not None:
+                start = max(start, end - last) if last > 0 else end
+            return [self._index[pos] for _, pos in keys[start:end]]
+
+    def read_entry(self, entry):
+        """
+        Load the full record for an index entry returned by ``entries()``.
+        """
+        return self._read(entry)
+
+    def iter_records(self):
+        """
+        Yield every stored record, oldest first, reading segments
+        sequentially (cheaper than ``get`` per run for full scans).
+        """
+        handle, current = None, None
+        try:
+            for _, _, _, segment, offset in self.entries():
+                if segment != current:
+                    if handle is not None:
+                        handle.close()
+                    handle, current = open(segment, 'rb'), segment
+                handle.seek(offset)
+                yield json.loads(handle.readline().decode('utf-8'))
+        finally:
+            if handle is not None:
+                handle.close()
+
+    def subscribe(self, callback):
+        """
+        Register ``callback(record)`` to be called after each appended run.
+        """
+        self._listeners.append(callback)
+
+    def __len__(self):
+        return len(self._index)
+
+    # -- internals ----------------------------------------------------------
+
+    def _make_record(self, cards, site, ts, camera=None):
+        record = {
+            'id': uuid.uuid4().hex,
+            'ts': float(ts) if ts is not None else time.time(),
+            'site': site,
+            'cards': cards,
+        }
+        if camera is not None:
+            record['camera'] = camera
+        return record
+
+    def _notify(self, record):
+        for cb in list(self._listeners):
+            try:
+                cb(record)
+            except Exception as e:
+                logger.error("RunStore listener failed: %s", e, exc_info=True)
+
+    def _add_to_index(self, record, segment, offset):
+        entry = (record['id'], record.get('ts'), record.get('site'), segment, offset)
+        key = (entry[1] or 0, len(self._index))
+        self._index.append(entry)
+        self._by_id[record['id']] = entry
+        _insert(self._by_time, key)
+        if entry[2] is not None:
+            _insert(self._sites.setdefault(entry[2], []), key)
+
+    def _segments(self):
+        names = [
+            n for n in os.listdir(self.runs_dir)
+            if n.startswith(self.SEGMENT_PREFIX) and n.endswith(self.SEGMENT_SUFFIX)
+        ]
+        return [os.path.join(self.runs_dir, n) for n in sorted(names)]
+
+    def _segment_path(self, number):
+        return os.path.join(self.runs_dir, f"{self.SEGMENT_PREFIX}{number:06d}{self.SEGMENT_SUFFIX}")
+
+    def _active_segment(self):
+        segments = self._segments()
+        if not segments:
+            return self._segment_path(1)
+        last = segments[-1]
+        if os.path.getsize(last) < self.segment_max_bytes:
+            return last
+        number = int(os.path.basename(last)[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)])
+        return self._segment_path(number + 1)
+
+    def _read(self, entry):
+        _, _, _, segment, offset = entry
+        with open(segment, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline().decode('utf-8'))
+
+    def _load(self):
+        latest = None
+        for segment in self._segments():
+            good_end = 0
+            with open(segment, 'rb') as f:
+                offset = 0
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # Torn write from a crash: drop the partial tail
+                        break
+                    try:
+                        record = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        logger.warning("Skipping corrupt run record in %s at %d", segment, offset)
+                        offset += len(line)
+                        good_end = offset
+                        continue
+                    self._add_to_index(record, segment, offset)
+                    latest = record
+                    offset += len(line)
+                    good_end = offset
+            if good_end < os.path.getsize(segment):
+                logger.warning("Truncating partial run record at end of %s", segment)
+                with open(segment, 'r+b') as f:
+                    f.truncate(good_end)
+        self._latest = latest
+        logger.info("RunStore loaded %d runs from %s", len(self._index), self.runs_dir)
+
+    def _migrate_legacy(self):
+        """
+        Import runs from the old ``last_analysis.json`` (a list of card lists,
+        or a single flat list of cards). The legacy file is left in place.
+        """
+        try:
+            with open(self.legacy_path, 'r') as f:
+                existing = json.load(f)
+        except Exception as e:
+            logger.error("Could not read legacy analysis file %s: %s", self.legacy_path, e)
+            return
+        runs = []
+        if isinstance(existing, list) and existing:
+            if isinstance(existing[0], list):
+                runs = existing
+            elif isinstance(existing[0], dict):
+                runs = [existing]
+        if not runs:
+            return
+        # Legacy runs carry no timestamps; space them out before the file mtime
+        base = os.path.getmtime(self.legacy_path) - len(runs)
+        records = [self._make_record(cards, None, base + i) for i, cards in enumerate(runs)]
+        tmp = self._segment_path(1) + '.tmp'
+        with open(tmp, 'w') as f:
+            for rec in records:
+                f.write(json.dumps(rec, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._segment_path(1))
+        logger.info("Migrated %d legacy runs from %s", len(records), self.legacy_path)
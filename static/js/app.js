@@ -4,7 +4,17 @@ document.addEventListener('DOMContentLoaded', () => {
   // Export button removed: no PDF export
   const voiceBtn = document.getElementById('voice-btn');
 
-  // capture a frame and send to /api/analysis, return cards array
+  function renderCard(item) {
+    const card = document.createElement('div');
+    card.className = 'card';
+    const title = document.createElement('strong'); title.textContent = item.title;
+    const desc = document.createElement('p'); desc.style.fontSize = '0.9em'; desc.textContent = item.description;
+    card.appendChild(title);
+    card.appendChild(desc);
+    cardsContainer.appendChild(card);
+  }
+
+  // capture a frame and stream its analysis from /api/analysis/stream, return cards array
   async function fetchAnalysis() {
     cardsContainer.innerHTML = '<div class="loading">Loading analysis...</div>';
     cardsContainer.innerHTML = '<div class="loading">Loading analysis...</div>';
@@ -25,23 +35,45 @@ document.addEventListener('DOMContentLoaded', () => {
       console.log('Snapshot blob size:', blob.size, 'bytes');
       const form = new FormData();
       form.append('snapshot', blob, 'snapshot.jpg');
-      console.log('Sending snapshot to /api/analysis');
-      const resp = await fetch('/api/analysis', { method: 'POST', body: form });
+      console.log('Streaming snapshot analysis from /api/analysis/stream');
+      const resp = await fetch('/api/analysis/stream', { method: 'POST', body: form });
       if (!resp.ok) throw new Error(`Status ${resp.status}`);
-      const data = await resp.json();
-      console.log('Received analysis data:', data);
+      const data = [];
+      let finished = false;
       cardsContainer.innerHTML = '';
-      if (Array.isArray(data) && data.length > 0) {
-        data.forEach(item => {
-          const card = document.createElement('div');
-          card.className = 'card';
-          const title = document.createElement('strong'); title.textContent = item.title;
-          const desc = document.createElement('p'); desc.style.fontSize = '0.9em'; desc.textContent = item.description;
-          card.appendChild(title);
-          card.appendChild(desc);
-          cardsContainer.appendChild(card);
-        });
-      } else {
+      // Parse Server-Sent Events off the response body and render cards as they arrive
+      const reader = resp.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) >= 0) {
+          const frame = buffer.slice(0, sep);
+          buffer = buffer.slice(sep + 2);
+          let event = 'message';
+          let payload = '';
+          frame.split('\n').forEach(line => {
+            if (line.startsWith('event: ')) event = line.slice(7);
+            else if (line.startsWith('data: ')) payload += line.slice(6);
+          });
+          if (event === 'card') {
+            const item = JSON.parse(payload);
+            data.push(item);
+            renderCard(item);
+          } else if (event === 'done') {
+            console.log('Analysis run saved:', JSON.parse(payload).run_id);
+            finished = true;
+          } else if (event === 'error') {
+            console.error('Analysis stream error:', payload);
+            finished = true;
+          }
+        }
+      }
+      console.log('Received analysis data:', data);
+      if (data.length === 0) {
         cardsContainer.innerHTML = '<div class="no-results">No analysis available.</div>';
       }
       return data;
@@ -0,0 +1,69 @@
+import json
+
+from card_stream import CardStreamParser, parse_batch_cards, strip_code_fences
+
+
+def feed_all(parser, chunks):
+    found = []
+    for chunk in chunks:
+        found.extend(parser.feed(chunk))
+    return found
+
+
+def test_cards_emitted_as_objects_close():
+    parser = CardStreamParser()
+    assert parser.feed('```json\n[{"title": "A", "desc') == []
+    assert parser.feed('ription": "a"}, {"title"') == [{'title': 'A', 'description': 'a'}]
+    assert parser.feed(': "B", "description": "b"}]```') == [{'title': 'B', 'description': 'b'}]
+    assert parser.finished
+    assert len(parser.cards) == 2
+
+
+def test_braces_and_brackets_inside_strings():
+    parser = CardStreamParser()
+    cards = feed_all(parser, ['[{"title": "x}]", "description": "say \\"[{\\" ok"}', ']'])
+    assert cards == [{'title': 'x}]', 'description': 'say "[{" ok'}]
+    assert parser.finished
+
+
+def test_unterminated_array_is_not_finished():
+    parser = CardStreamParser()
+    feed_all(parser, ['[{"title": "A", "description": "a"}, {"title": "B"'])
+    assert parser.cards == [{'title': 'A', 'description': 'a'}]
+    assert parser.started and not parser.finished
+
+
+def test_bracket_in_prose_yields_no_cards():
+    parser = CardStreamParser()
+    feed_all(parser, ['Site overview [pass 3]: ', 'scaffolding intact.'])
+    assert parser.cards == []
+    assert parser.text == 'Site overview [pass 3]: scaffolding intact.'
+
+
+def test_malformed_card_is_skipped():
+    parser = CardStreamParser()
+    cards = feed_all(parser, ['[{"title": "A",}, {"title": "B"}]'])
+    assert cards == [{'title': 'B'}]
+
+
+def test_strip_code_fences():
+    assert strip_code_fences('```json\n[{"a": 1}]\n```') == '[{"a": 1}]'
+    assert strip_code_fences(' [1] ') == '[1]'
+
+
+def test_batch_cards_map_by_frame_number():
+    text = '```json\n[{"frame": 2, "cards": [{"title": "b"}]}, {"frame": 1, "cards": [{"title": "a"}]}]\n```'
+    assert parse_batch_cards(text, 3) == [[{'title': 'a'}], [{'title': 'b'}], None]
+
+
+def test_batch_cards_fall_back_to_position_and_ignore_bad_items():
+    text = json.dumps({'frames': [
+        [{'title': 'first'}],
+        {'frame': 'x', 'cards': [{'title': 'second'}]},
+        {'frame': 9, 'cards': []},
+        {'frame': 1, 'cards': [{'title': 'duplicate'}]},
+        'junk',
+    ]})
+    assert parse_batch_cards(text, 3) == [[{'title': 'first'}], [{'title': 'second'}], None]
+    assert parse_batch_cards('not json', 2) == [None, None]
+    assert parse_batch_cards('{"cards": 1}', 1) == [None]
@@ -0,0 +1,79 @@
+import io
+
+import pytest
+
+import frame_cache
+from frame_cache import FrameCache, hamming
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def jpeg(color, size=(64, 48)):
+    buf = io.BytesIO()
+    Image.new('RGB', size, color).save(buf, 'JPEG')
+    return buf.getvalue()
+
+
+def gradient(size=(64, 48)):
+    img = Image.new('L', size)
+    img.putdata([255 - x * 4 for y in range(size[1]) for x in range(size[0])])
+    buf = io.BytesIO()
+    img.save(buf, 'PNG')
+    return buf.getvalue()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(frame_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def test_hash_is_namespaced_and_none_for_garbage():
+    cache = FrameCache()
+    namespace, value = cache.hash(gradient(), ('a', 'cam1'))
+    assert namespace == ('a', 'cam1') and value
+    assert cache.hash(b'not an image') is None
+    assert cache.lookup(None) is None
+
+
+def test_lookup_within_threshold():
+    cache = FrameCache(threshold=2)
+    cache.store((None, 0b1111), ['cards'])
+    assert cache.lookup((None, 0b0111)) == ['cards']
+    assert cache.lookup((None, 0b0001)) is None
+    assert hamming(0b1111, 0b0001) == 3
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_featureless_frames_do_not_cross_namespaces():
+    cache = FrameCache()
+    a = cache.hash(jpeg((0, 0, 0)), ('site-a', 'cam1'))
+    b = cache.hash(jpeg((200, 200, 200)), ('site-b', 'cam1'))
+    c = cache.hash(jpeg((10, 10, 10)), ('site-a', 'cam2'))
+    assert a[1] == b[1] == c[1] == 0
+    cache.store(a, ['a'])
+    assert cache.lookup(b) is None and cache.lookup(c) is None
+    assert cache.lookup(cache.hash(jpeg((5, 5, 5)), ('site-a', 'cam1'))) == ['a']
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = FrameCache(ttl=10)
+    cache.store(('s', 1), ['x'])
+    clock[0] += 9
+    assert cache.lookup(('s', 1)) == ['x']
+    clock[0] += 2
+    assert cache.lookup(('s', 1)) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_lru_eviction_keeps_recently_used(clock):
+    cache = FrameCache(max_entries=2, threshold=0)
+    cache.store(('s', 1), ['one'])
+    cache.store(('s', 2), ['two'])
+    assert cache.lookup(('s', 1)) == ['one']
+    cache.store(('s', 4), ['four'])
+    assert cache.lookup(('s', 2)) is None
+    assert cache.lookup(('s', 1)) == ['one'] and cache.lookup(('s', 4)) == ['four']
+    cache.clear()
+    assert cache.stats()['entries'] == 0
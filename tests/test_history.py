@@ -0,0 +1,69 @@
+from history import HistoryIndex
+
+
+def record(i, ts, title='Progress', description='', site=None):
+    return {'id': f'run{i}', 'ts': ts, 'site': site, 'cards': [{'title': title, 'description': description}]}
+
+
+def all_pages(index, limit, **query):
+    ids, cursor = index.search(limit=limit, **query)
+    pages = [ids]
+    while cursor is not None:
+        ids, cursor = index.search(cursor=cursor, limit=limit, **query)
+        pages.append(ids)
+    return pages
+
+
+def test_cursor_pagination_covers_every_run_once():
+    index = HistoryIndex()
+    for i in range(23):
+        index.add(record(i, 1000 + i))
+    pages = all_pages(index, 5)
+    flat = [run_id for page in pages for run_id in page]
+    assert flat == [f'run{i}' for i in range(22, -1, -1)]
+    assert [len(p) for p in pages] == [5, 5, 5, 5, 3]
+
+
+def test_exact_page_size_has_no_trailing_cursor():
+    index = HistoryIndex()
+    for i in range(10):
+        index.add(record(i, i))
+    ids, cursor = index.search(limit=10)
+    assert len(ids) == 10 and cursor is None
+
+
+def test_back_dated_runs_sort_by_time():
+    index = HistoryIndex()
+    index.add(record(0, 100))
+    index.add(record(1, 300))
+    index.add(record(2, 200))
+    assert all_pages(index, 1) == [['run1'], ['run2'], ['run0']]
+
+
+def test_text_site_and_range_filters_combine():
+    index = HistoryIndex()
+    index.add(record(0, 10, 'Safety', 'workers missing PPE', site='a'))
+    index.add(record(1, 20, 'Safety', 'PPE ok, crane idle', site='b'))
+    index.add(record(2, 30, 'Progress', 'crane lifting PPE crates', site='a'))
+    index.add(record(3, 40, 'Safety', 'all clear', site='a'))
+    assert index.search('ppe')[0] == ['run2', 'run1', 'run0']
+    assert index.search('PPE crane')[0] == ['run2', 'run1']
+    assert index.search('ppe', site='a')[0] == ['run2', 'run0']
+    assert index.search('ppe', since=15, until=30)[0] == ['run2', 'run1']
+    assert all_pages(index, 1, query='ppe crane') == [['run2'], ['run1']]
+    assert index.search('nothing')[0] == []
+
+
+def test_trend_buckets_and_points():
+    index = HistoryIndex()
+    day = 86400
+    for i, ts in enumerate([0, 10, day + 5, 2 * day + 1]):
+        index.add(record(i, ts, 'Safety detection'))
+    index.add(record(9, day + 7, 'Budget'))
+    trend = index.trend('safety', limit=2)
+    assert trend['total'] == 4
+    assert trend['buckets'] == [{'start': 0, 'count': 2}, {'start': day, 'count': 1}, {'start': 2 * day, 'count': 1}]
+    assert [p['run_id'] for p in trend['points']] == ['run2', 'run3']
+    # Partial days at the range edges are counted exactly
+    assert index.trend('safety', since=5, until=day + 5)['total'] == 2
+    assert index.trend('safety', bucket=3600, until=10)['buckets'] == [{'start': 0, 'count': 2}]
@@ -0,0 +1,107 @@
+import io
+
+import pytest
+
+from imaging import ImageNormalizer, ImageRejected, fit_to_budget, image_tokens, parse_roi, sniff_format
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def jpeg(size=(640, 480), color=(120, 90, 60), exif=None):
+    buf = io.BytesIO()
+    kwargs = {'exif': exif} if exif is not None else {}
+    Image.new('RGB', size, color).save(buf, 'JPEG', **kwargs)
+    return buf.getvalue()
+
+
+def png(size=(64, 64)):
+    buf = io.BytesIO()
+    Image.new('RGBA', size).save(buf, 'PNG')
+    return buf.getvalue()
+
+
+def test_image_tokens_matches_tiling():
+    assert image_tokens(512, 512) == 85 + 170
+    assert image_tokens(1024, 1024) == 85 + 170 * 4
+    # 4000x3000 fits 2048, then shortest side to 768: 1024x768 -> 2x2 tiles
+    assert image_tokens(4000, 3000) == 85 + 170 * 4
+    assert image_tokens(4000, 3000, detail='low') == 85
+
+
+@pytest.mark.parametrize('size,budget,max_dim', [
+    ((4000, 3000), 765, 1536),
+    ((4000, 3000), 425, 1536),
+    ((3000, 4000), 255, 1536),
+    ((1920, 1080), 765, 1024),
+    ((100, 80), 765, 1536),
+])
+def test_fit_to_budget_keeps_aspect_and_budget(size, budget, max_dim):
+    w, h = fit_to_budget(size[0], size[1], budget, max_dim)
+    assert image_tokens(w, h) <= budget or max(w, h) <= 512
+    assert max(w, h) <= max(max_dim, 1) and w <= size[0] and h <= size[1]
+    assert abs(w / h - size[0] / size[1]) < 0.02
+
+
+def test_fit_to_budget_never_upscales():
+    assert fit_to_budget(300, 200, 10 ** 6, 1536) == (300, 200)
+
+
+def test_sniff_and_parse_roi():
+    assert sniff_format(jpeg((8, 8))) == 'image/jpeg'
+    assert sniff_format(png()) == 'image/png'
+    assert sniff_format(b'hello') is None
+    assert parse_roi('0.5,0.5,0.8,0.8') == (0.5, 0.5, 0.5, 0.5)
+    assert parse_roi('') is None
+    for bad in ('1,2', 'a,b,c,d', '0,0,0,1', '1,0,0.5,0.5'):
+        with pytest.raises(ImageRejected):
+            parse_roi(bad)
+
+
+def test_fitting_jpeg_passes_through_unchanged():
+    data = jpeg((640, 480))
+    out, info = ImageNormalizer().normalize(data)
+    assert out is data and info['passthrough']
+
+
+def test_truncated_jpeg_is_rejected():
+    data = jpeg((640, 480))
+    with pytest.raises(ImageRejected) as exc:
+        ImageNormalizer().normalize(data[:len(data) // 3])
+    assert exc.value.status == 400
+
+
+def test_large_image_is_resized_to_budget():
+    out, info = ImageNormalizer(token_budget=765).normalize(jpeg((4000, 3000)))
+    assert not info['passthrough']
+    assert info['tokens'] <= 765
+    assert Image.open(io.BytesIO(out)).size == info['size']
+
+
+def test_exif_rotation_sizes_upright_frame():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees clockwise
+    out, info = ImageNormalizer(max_dim=1000).normalize(jpeg((2000, 1000), exif=exif))
+    w, h = Image.open(io.BytesIO(out)).size
+    assert h > w and max(w, h) <= 1000
+
+
+def test_roi_crop_and_png_reencode():
+    out, info = ImageNormalizer().normalize(jpeg((1000, 1000)), roi=(0.0, 0.0, 0.5, 0.25))
+    assert Image.open(io.BytesIO(out)).size == (500, 250)
+    out, info = ImageNormalizer().normalize(png())
+    assert sniff_format(out) == 'image/jpeg' and info['format'] == 'image/png'
+
+
+def test_rejections():
+    normalizer = ImageNormalizer(max_bytes=1000, max_pixels=10_000)
+    with pytest.raises(ImageRejected):
+        normalizer.normalize(b'')
+    with pytest.raises(ImageRejected) as exc:
+        normalizer.normalize(b'x' * 2000)
+    assert exc.value.status == 413
+    with pytest.raises(ImageRejected) as exc:
+        normalizer.normalize(b'not an image')
+    assert exc.value.status == 415
+    with pytest.raises(ImageRejected) as exc:
+        ImageNormalizer(max_pixels=10_000).normalize(jpeg((200, 200)))
+    assert exc.value.status == 413
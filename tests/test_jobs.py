@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from jobs import JobQueue, QueueFull
+
+
+@pytest.fixture
+def jobs():
+    queue = JobQueue(workers=1, max_pending=1, timeout=5.0)
+    yield queue
+    queue.shutdown()
+
+
+def test_result_failure_and_subscribers(jobs):
+    events = jobs.subscribe()
+    done = jobs.wait(jobs.submit('ok', lambda x: x * 2, 21, meta={'site': 'a'}))
+    assert done.status == 'done' and done.to_dict()['result'] == 42
+    failed = jobs.wait(jobs.submit('bad', lambda: 1 / 0))
+    assert failed.status == 'failed' and 'division' in failed.error
+    assert [events.get(timeout=1)['status'] for _ in range(2)] == ['done', 'failed']
+    assert done.to_dict()['site'] == 'a'
+    assert jobs.get(done.id) is done
+
+
+def test_submit_raises_queue_full_beyond_backlog(jobs):
+    release = threading.Event()
+    running = jobs.submit('slow', release.wait, 5)
+    queued = jobs.submit('slow', release.wait, 5)
+    with pytest.raises(QueueFull):
+        jobs.submit('slow', release.wait, 5)
+    assert jobs.stats()['rejected'] == 1 and jobs.stats()['in_flight'] == 2
+    release.set()
+    assert jobs.wait(running).status == 'done' and jobs.wait(queued).status == 'done'
+    jobs.wait(jobs.submit('ok', lambda: None))
+
+
+def test_per_job_timeout_discards_late_result(jobs):
+    release = threading.Event()
+    job = jobs.submit('slow', lambda: release.wait(5) and 'late', timeout=0.1)
+    assert jobs.wait(job).status == 'timeout'
+    release.set()
+    # The late result never replaces the timeout
+    assert jobs.wait(jobs.submit('ok', lambda: 'next')).result == 'next'
+    assert job.status == 'timeout' and job.result is None
+    assert jobs.stats()['timed_out'] == 1
+
+
+def test_job_timed_out_while_queued_never_runs(jobs):
+    release = threading.Event()
+    ran = []
+    blocker = jobs.submit('slow', release.wait, 5)
+    queued = jobs.submit('queued', lambda: ran.append(1), timeout=0.05)
+    assert jobs.wait(queued).status == 'timeout'
+    release.set()
+    jobs.wait(blocker)
+    jobs.wait(jobs.submit('ok', lambda: None))
+    assert ran == [] and jobs.stats()['in_flight'] == 0
+
+
+def test_finished_jobs_are_pruned_after_retention():
+    jobs = JobQueue(workers=1, retention=0.0)
+    try:
+        job = jobs.wait(jobs.submit('ok', lambda: 1))
+        jobs.wait(jobs.submit('ok', lambda: 2))
+        assert jobs.get(job.id) is None
+    finally:
+        jobs.shutdown()
@@ -0,0 +1,149 @@
+import time
+import threading
+
+import pytest
+
+from resilience import CallPolicy, CircuitBreaker, CircuitOpen, DeadlineExceeded, HedgePool
+
+
+class Upstream(Exception):
+    def __init__(self, status_code=500):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def retryable(e):
+    return getattr(e, 'status_code', 500) >= 500
+
+
+def tripped(cooldown=0.05):
+    breaker = CircuitBreaker('test', min_calls=2, failure_threshold=0.5, cooldown=cooldown)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_breaker_opens_and_fails_fast():
+    breaker = tripped(cooldown=10)
+    with pytest.raises(CircuitOpen) as exc:
+        breaker.allow()
+    assert exc.value.retry_after > 0
+
+
+def test_straggler_outcomes_do_not_close_or_reopen():
+    breaker = tripped()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.OPEN
+    opened = breaker.stats()['opened']
+    breaker.record(False)
+    assert breaker.stats()['opened'] == opened
+
+
+def test_single_probe_decides_half_open():
+    breaker = tripped()
+    time.sleep(0.06)
+    assert breaker.allow() is True
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    # A straggler finishing while the probe runs changes nothing
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record(True, probe=True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() is False
+
+
+def test_failed_probe_reopens():
+    breaker = tripped()
+    time.sleep(0.06)
+    assert breaker.allow() is True
+    breaker.record(False, probe=True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_retries_then_succeeds():
+    calls = []
+
+    def fn(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            raise Upstream(503)
+        return 'ok'
+
+    policy = CallPolicy('p', CircuitBreaker('b'), deadline=5, retries=1, backoff=0.01, retryable=retryable)
+    assert policy.call(fn) == 'ok'
+    assert len(calls) == 2 and all(0 < t <= 5 for t in calls)
+    assert policy.stats()['retried'] == 1
+
+
+def test_client_errors_are_not_retried_or_counted():
+    breaker = CircuitBreaker('b', min_calls=1)
+    policy = CallPolicy('p', breaker, retries=3, retryable=retryable)
+    with pytest.raises(Upstream):
+        policy.call(lambda timeout: (_ for _ in ()).throw(Upstream(400)))
+    assert policy.stats()['retried'] == 0
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_client_timeout_becomes_deadline_exceeded():
+    class ClientTimeout(Exception):
+        pass
+
+    def fn(timeout):
+        time.sleep(timeout)
+        raise ClientTimeout()
+
+    policy = CallPolicy('p', CircuitBreaker('b'), deadline=0.05, retries=0,
+                        is_timeout=lambda e: isinstance(e, ClientTimeout))
+    with pytest.raises(DeadlineExceeded):
+        policy.call(fn)
+    assert policy.stats()['deadline_exceeded'] == 1
+
+
+def test_failure_past_deadline_becomes_deadline_exceeded():
+    def fn(timeout):
+        time.sleep(timeout + 0.01)
+        raise Upstream(502)
+
+    policy = CallPolicy('p', CircuitBreaker('b'), deadline=0.05, retries=2, retryable=retryable)
+    with pytest.raises(DeadlineExceeded):
+        policy.call(fn)
+    assert policy.stats()['deadline_exceeded'] == 1
+
+
+def test_open_circuit_short_circuits_policy():
+    policy = CallPolicy('p', tripped(cooldown=10))
+    with pytest.raises(CircuitOpen):
+        policy.call(lambda timeout: 'never')
+    assert policy.stats()['short_circuited'] == 1
+
+
+def test_hedge_wins_on_slow_primary():
+    calls = []
+
+    def fn(timeout):
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return 'slow'
+        return 'fast'
+
+    policy = CallPolicy('p', CircuitBreaker('b'), deadline=2, hedge_after=0.02, hedge_pool=HedgePool(2))
+    started = time.monotonic()
+    assert policy.call(fn) == 'fast'
+    assert time.monotonic() - started < 0.4
+    assert policy.stats()['hedge_wins'] == 1
+    assert calls[1].startswith('hedge')
+
+
+def test_no_hedge_when_pool_is_busy():
+    pool = HedgePool(1)
+    release = threading.Event()
+    assert pool.try_submit(release.wait) is not None
+    try:
+        policy = CallPolicy('p', CircuitBreaker('b'), deadline=2, hedge_after=0.01, hedge_pool=pool)
+        assert policy.call(lambda timeout: time.sleep(0.05) or 'done') == 'done'
+        assert policy.stats()['hedged'] == 0
+    finally:
+        release.set()
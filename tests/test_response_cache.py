@@ -0,0 +1,56 @@
+import threading
+
+from response_cache import VersionedCache, normalize_question
+
+
+def test_normalize_question():
+    assert normalize_question('  What is   THIS?? ') == 'what is this'
+    assert normalize_question('Status.\n') == normalize_question('status')
+
+
+def test_get_and_put_only_for_current_version():
+    cache = VersionedCache(version=1)
+    cache.put('q', 1, 'a')
+    assert cache.get('q', 1) == 'a'
+    assert cache.get('q', 2) is None
+    # A reply computed against an older version is not stored
+    cache.invalidate(2)
+    cache.put('q', 1, 'stale')
+    assert cache.get('q', 2) is None
+    cache.put('q', 2, 'fresh')
+    assert cache.get('q', 2) == 'fresh'
+
+
+def test_invalidate_never_moves_backwards():
+    cache = VersionedCache(version=5)
+    cache.put('q', 5, 'a')
+    cache.invalidate(5)
+    cache.invalidate(3)
+    assert cache.get('q', 5) == 'a'
+    assert cache.stats()['invalidations'] == 0
+    cache.invalidate(6)
+    assert cache.get('q', 5) is None and cache.stats()['version'] == 6
+
+
+def test_lru_bound_and_get_or_create():
+    cache = VersionedCache(max_entries=2, version=0)
+    calls = []
+    for key in ('a', 'b', 'a', 'c'):
+        cache.get_or_create(key, 0, lambda key=key: calls.append(key) or key.upper())
+    assert calls == ['a', 'b', 'c']
+    assert cache.get('b', 0) is None and cache.get('a', 0) == 'A'
+    assert cache.stats()['entries'] == 2
+
+
+def test_racing_invalidations_settle_on_newest_version():
+    cache = VersionedCache(version=0)
+    versions = list(range(1, 201))
+    threads = [threading.Thread(target=lambda chunk=versions[k::4]: [cache.invalidate(v) for v in chunk])
+               for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.stats()['version'] == 200
+    cache.put('q', 199, 'stale')
+    assert cache.get('q', 200) is None and cache.stats()['entries'] == 0
@@ -0,0 +1,74 @@
+import os
+import json
+
+from run_store import RunStore
+
+
+def test_append_latest_and_get(tmp_path):
+    store = RunStore(str(tmp_path), legacy_file=None)
+    first = store.append([{'title': 'A'}], site='s1', ts=100)
+    second = store.append([{'title': 'B'}], ts=200)
+    assert store.latest()['id'] == second['id']
+    assert store.latest_cards() == [{'title': 'B'}]
+    assert store.get(first['id'])['site'] == 's1'
+    assert store.version == 2
+    assert [r['id'] for r in store.iter_records()] == [first['id'], second['id']]
+
+
+def test_reload_truncates_torn_tail(tmp_path):
+    store = RunStore(str(tmp_path), legacy_file=None)
+    kept = store.append([{'title': 'A'}], ts=1)
+    segment = store.entries()[0][3]
+    good_size = os.path.getsize(segment)
+    with open(segment, 'ab') as f:
+        f.write(b'{"id": "torn", "cards": [')
+    reloaded = RunStore(str(tmp_path), legacy_file=None)
+    assert len(reloaded) == 1
+    assert reloaded.latest()['id'] == kept['id']
+    assert os.path.getsize(segment) == good_size
+    # Appends after recovery land on a clean line boundary
+    added = reloaded.append([{'title': 'B'}], ts=2)
+    assert [r['id'] for r in RunStore(str(tmp_path), legacy_file=None).iter_records()] == [kept['id'], added['id']]
+
+
+def test_corrupt_line_skipped(tmp_path):
+    store = RunStore(str(tmp_path), legacy_file=None)
+    store.append([{'title': 'A'}], ts=1)
+    segment = store.entries()[0][3]
+    with open(segment, 'ab') as f:
+        f.write(b'not json\n')
+    store = RunStore(str(tmp_path), legacy_file=None)
+    after = store.append([{'title': 'B'}], ts=2)
+    assert len(RunStore(str(tmp_path), legacy_file=None)) == 2
+    assert store.get(after['id'])['cards'] == [{'title': 'B'}]
+
+
+def test_legacy_migration(tmp_path):
+    with open(tmp_path / 'last_analysis.json', 'w') as f:
+        json.dump([[{'title': 'old1'}], [{'title': 'old2'}]], f)
+    store = RunStore(str(tmp_path))
+    assert len(store) == 2
+    assert store.latest_cards() == [{'title': 'old2'}]
+    assert (tmp_path / 'last_analysis.json').exists()
+
+
+def test_select_and_subscribe(tmp_path):
+    store = RunStore(str(tmp_path), legacy_file=None)
+    seen = []
+    store.subscribe(seen.append)
+    store.append_many([{'cards': [], 'ts': t, 'site': 'a' if t % 2 else 'b'} for t in range(10)])
+    assert len(seen) == 10
+    assert [e[1] for e in store.select(since=3, until=6)] == [3, 4, 5, 6]
+    assert [e[1] for e in store.select(site='a', last=2)] == [7, 9]
+
+
+def test_select_orders_back_dated_runs_by_time(tmp_path):
+    store = RunStore(str(tmp_path), legacy_file=None)
+    for t in (5, 1, 9, 3, 7):
+        store.append([], site='a', ts=t)
+    assert [e[1] for e in store.select()] == [1, 3, 5, 7, 9]
+    assert [e[1] for e in store.select(since=2, until=8, last=2)] == [5, 7]
+    assert [e[1] for e in store.select(site='a', until=4)] == [1, 3]
+    assert store.select(site='missing') == [] and store.select(last=0) == []
+    # The index is rebuilt in the same order after a restart
+    assert [e[1] for e in RunStore(str(tmp_path), legacy_file=None).select(last=3)] == [5, 7, 9]